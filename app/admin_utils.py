@@ -18,11 +18,11 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated:
             flash('Please log in to access this page.', 'warning')
-            return redirect(url_for('login'))
+            return redirect(url_for('auth.login'))
 
-        if not current_user.is_admin():
+        if not current_user.is_admin:
             flash('Admin privileges required to access this page.', 'danger')
-            return redirect(url_for('course_dashboard'))
+            return redirect(url_for('course.course_dashboard'))
 
         return f(*args, **kwargs)
 
@@ -0,0 +1,172 @@
+"""
+Content-addressed cache for AI responses.
+Entries are keyed by a hash of (model, generation config, prompt), so only prompts
+that are pure functions of their inputs should be routed through it.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+CACHE_BACKEND = os.getenv("AI_CACHE_BACKEND", "memory")  # memory | sqlite | none
+CACHE_TTL = int(os.getenv("AI_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", 1000))
+CACHE_PATH = os.getenv("AI_CACHE_PATH", os.path.join("instance", "ai_cache.db"))
+
+
+def make_cache_key(model: str, config: Dict[str, Any], prompt: str) -> str:
+    """Return a stable hash of everything that determines the model's response."""
+    payload = json.dumps([model, config, prompt], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Base class for response cache backends. Tracks hit, miss and eviction counters."""
+
+    def __init__(self, ttl: int = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        """Return the cached (text, tokens) for a key, or None."""
+        with self._lock:
+            value = self._get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key: str, text: str, tokens: int):
+        with self._lock:
+            self.evictions += self._set(key, text, tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": type(self).__name__,
+                "entries": self._size(),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    # Backend hooks; called with the lock held
+    @abstractmethod
+    def _get(self, key: str) -> Optional[Tuple[str, int]]:
+        ...
+
+    @abstractmethod
+    def _set(self, key: str, text: str, tokens: int) -> int:
+        """Store an entry and return the number of entries evicted to make room."""
+
+    @abstractmethod
+    def _size(self) -> int:
+        ...
+
+
+class MemoryLRUCache(ResponseCache):
+    """In-process LRU cache. Each worker process keeps its own entries."""
+
+    def __init__(self, ttl: int = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, text, tokens = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return text, tokens
+
+    def _set(self, key, text, tokens):
+        self._entries[key] = (time.time() + self.ttl, text, tokens)
+        self._entries.move_to_end(key)
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def _size(self):
+        return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+    """SQLite-backed cache shared by every worker process on the host."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: int = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_response_cache ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " tokens INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_ai_response_cache_last_used ON ai_response_cache (last_used)")
+
+    def _get(self, key):
+        row = self._conn.execute(
+            "SELECT response, tokens, expires_at FROM ai_response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        text, tokens, expires_at = row
+        now = time.time()
+        if expires_at < now:
+            self._conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+            return None
+        self._conn.execute("UPDATE ai_response_cache SET last_used = ? WHERE key = ?", (now, key))
+        return text, tokens
+
+    def _set(self, key, text, tokens):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO ai_response_cache (key, response, tokens, expires_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, text, tokens, now + self.ttl, now),
+        )
+        overflow = self._size() - self.max_entries
+        if overflow <= 0:
+            return 0
+        self._conn.execute(
+            "DELETE FROM ai_response_cache WHERE key IN "
+            "(SELECT key FROM ai_response_cache ORDER BY last_used LIMIT ?)",
+            (overflow,),
+        )
+        return overflow
+
+    def _size(self):
+        return self._conn.execute("SELECT COUNT(*) FROM ai_response_cache").fetchone()[0]
+
+
+def create_cache(backend: str = CACHE_BACKEND) -> Optional[ResponseCache]:
+    """Build the configured cache backend; returns None when caching is disabled."""
+    if backend == "memory":
+        return MemoryLRUCache()
+    if backend == "sqlite":
+        return SQLiteCache()
+    return None
@@ -1,9 +1,22 @@
 import os
+import time
+import threading
 import google.generativeai as genai
-from typing import Generator, Tuple, Optional, List
+from contextvars import ContextVar
+from typing import AsyncIterator, Generator, NamedTuple, Tuple, Optional, List
+from app.ai_pool import ModelPool, AsyncLoopRunner, MAX_CONCURRENT_REQUESTS, cooperative_runtime
+from app.ai_cache import ResponseCache, create_cache, make_cache_key
+
+# Under gevent the asyncio loop thread and gRPC's own threads do not cooperate with the hub,
+# so calls are made synchronously over the REST transport, whose sockets gevent patches.
+COOPERATIVE = cooperative_runtime()
 
 # Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"),
+                transport=os.getenv("GEMINI_TRANSPORT") or ("rest" if COOPERATIVE else None))
+
+# How long a discovered model list stays fresh, in seconds
+MODEL_LIST_TTL = int(os.getenv("AI_MODEL_LIST_TTL", 3600))
 
 def list_available_models() -> List[str]:
     """List all available models from the API."""
@@ -14,13 +27,57 @@ def list_available_models() -> List[str]:
         print(f"Error listing models: {e}")
         return []
 
-# Get available models and use the first suitable one
-available_models = list_available_models()
-print("Available models:", available_models)
+class ModelRegistry:
+    """
+    Lazily discovered, TTL-cached list of available models.
+    Nothing is fetched at import time: the list is filled on first use, and once it
+    goes stale it is refreshed in a background thread while the old list keeps being served.
+    """
+
+    def __init__(self, ttl: int = MODEL_LIST_TTL):
+        self.ttl = ttl
+        self._models: Optional[List[str]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _is_fresh(self) -> bool:
+        return self._models is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    def refresh(self) -> List[str]:
+        """Fetch the model list now and store it."""
+        models = list_available_models()
+        with self._lock:
+            # Keep the previous list if the API could not be reached
+            if models or self._models is None:
+                self._models = models
+            self._fetched_at = time.monotonic()
+            self._refreshing = False
+        return self._models
+
+    def refresh_in_background(self):
+        """Start a refresh without blocking the caller; no-op if one is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name="ai-model-discovery", daemon=True).start()
+
+    def get(self) -> List[str]:
+        """Return the available models, fetching them on first use."""
+        if self._models is None:
+            return self.refresh()
+        if not self._is_fresh():
+            self.refresh_in_background()
+        return self._models
+
+model_registry = ModelRegistry()
+
+def available_models() -> List[str]:
+    return model_registry.get()
 
 # Use gemini-2.5-pro as the default model
 DEFAULT_MODEL = "gemini-2.5-pro"
-print(f"Using model: {DEFAULT_MODEL}")
 
 # Model configurations
 MODEL_CONFIGS = {
@@ -33,92 +90,220 @@ MODEL_CONFIGS = {
     }
 }
 
-def _call_gemini(prompt: str, model_name: str = None, json_mode: bool = False) -> Tuple[str, int]:
+_model_pool = ModelPool()
+_runner = AsyncLoopRunner()
+# Bounds in-flight generations when running cooperatively (a greenlet semaphore once patched)
+_cooperative_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+class AIUsage(NamedTuple):
+    """Token counts of one response, from its usage_metadata, or estimated when the response had none."""
+    prompt_tokens: int
+    output_tokens: int
+    total_tokens: int
+    estimated: bool
+
+
+class AICall(NamedTuple):
+    """What the most recent ask_ai() call, or finished ask_ai_stream(), in this context cost."""
+    model: str
+    prompt_tokens: int
+    output_tokens: int
+    total_tokens: int
+    latency_ms: int
+    cached: bool
+    estimated: bool
+
+
+_last_call: ContextVar[Optional[AICall]] = ContextVar("last_ai_call", default=None)
+
+def last_ai_call() -> Optional[AICall]:
+    return _last_call.get()
+
+def _resolve_config(model_name: str = None) -> Tuple[str, dict]:
+    """Map a requested model name to the configured model and its generation config."""
+    model_name = model_name or DEFAULT_MODEL
+    config = MODEL_CONFIGS.get(model_name, next(iter(MODEL_CONFIGS.values())))
+    return config["model"], {
+        "temperature": config["temperature"],
+        "top_p": config["top_p"],
+        "top_k": config["top_k"],
+        "max_output_tokens": config["max_output_tokens"],
+    }
+
+def _get_model(model_name: str = None) -> genai.GenerativeModel:
+    """Return the pooled GenerativeModel for the given model name."""
+    return _model_pool.get(*_resolve_config(model_name))
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, creating it on first use (None if disabled)."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = create_cache()
+    return _response_cache
+
+def response_cache_stats() -> dict:
+    cache = get_response_cache()
+    return cache.stats() if cache else {"backend": None}
+
+def _wrap_prompt(prompt: str, json_mode: bool) -> str:
+    if json_mode:
+        return f"""You are a helpful assistant that responds in JSON format. 
+        Ensure your response can be parsed by json.loads().
+        Here's the request: {prompt}"""
+    return prompt
+
+def _usage(usage_metadata, prompt_chars: int, output_chars: int) -> AIUsage:
+    if usage_metadata is not None and usage_metadata.total_token_count:
+        return AIUsage(usage_metadata.prompt_token_count, usage_metadata.candidates_token_count,
+                       usage_metadata.total_token_count, False)
+    # No usage reported; rough estimate: 1 token ~= 4 chars in English
+    prompt_tokens, output_tokens = prompt_chars // 4, output_chars // 4
+    return AIUsage(prompt_tokens, output_tokens, prompt_tokens + output_tokens, True)
+
+def _response_result(response, prompt: str) -> Tuple[str, AIUsage]:
+    if not response.text:
+        raise ValueError("No response text from Gemini API")
+    return response.text, _usage(getattr(response, "usage_metadata", None), len(prompt), len(response.text))
+
+def _chunk_result(chunk) -> Tuple[str, object]:
+    try:
+        text = chunk.text
+    except ValueError:
+        # A chunk without parts, e.g. the last one carrying only the finish reason and usage
+        text = ""
+    return text, getattr(chunk, "usage_metadata", None)
+
+async def _generate_async(prompt: str, model_name: str = None, json_mode: bool = False) -> Tuple[str, AIUsage]:
+    model = _get_model(model_name)
+    wrapped = _wrap_prompt(prompt, json_mode)
+    response = await model.generate_content_async(wrapped)
+    return _response_result(response, wrapped)
+
+async def _stream_async(prompt: str, model_name: str = None) -> AsyncIterator[Tuple[str, object]]:
+    model = _get_model(model_name)
+    response = await model.generate_content_async(prompt, stream=True)
+
+    async for chunk in response:
+        yield _chunk_result(chunk)
+
+def _generate_cooperative(prompt: str, model_name: str = None, json_mode: bool = False) -> Tuple[str, AIUsage]:
+    with _cooperative_slots:
+        wrapped = _wrap_prompt(prompt, json_mode)
+        response = _get_model(model_name).generate_content(wrapped)
+        return _response_result(response, wrapped)
+
+def _stream_cooperative(prompt: str, model_name: str = None) -> Generator[Tuple[str, object], None, None]:
+    with _cooperative_slots:
+        for chunk in _get_model(model_name).generate_content(prompt, stream=True):
+            yield _chunk_result(chunk)
+
+def _call_gemini(prompt: str, model_name: str = None, json_mode: bool = False) -> Tuple[str, AIUsage]:
     """
     Internal function to call Gemini API with the specified model.
-    Returns a tuple: (text_response, tokens_used)
+    The request runs on the shared AI event loop (or directly, under gevent); the caller waits for the result.
+    Returns a tuple: (text_response, usage)
     """
     try:
-        model_name = model_name or DEFAULT_MODEL
-        config = MODEL_CONFIGS.get(model_name, next(iter(MODEL_CONFIGS.values())))
-        
-        model = genai.GenerativeModel(
-            model_name=config["model"],
-            generation_config={
-                "temperature": config["temperature"],
-                "top_p": config["top_p"],
-                "top_k": config["top_k"],
-                "max_output_tokens": config["max_output_tokens"],
-            },
-        )
-        
-        if json_mode:
-            prompt = f"""You are a helpful assistant that responds in JSON format. 
-            Ensure your response can be parsed by json.loads().
-            Here's the request: {prompt}"""
-        
-        response = model.generate_content(prompt)
-        
-        if not response.text:
-            raise ValueError("No response text from Gemini API")
-            
-        # Estimate token usage (Gemini doesn't return token count in response)
-        # Rough estimate: 1 token ~= 4 chars in English
-        tokens_used = len(response.text) // 4
-        
-        return response.text, tokens_used
-        
+        if COOPERATIVE:
+            return _generate_cooperative(prompt, model_name, json_mode)
+        return _runner.run(_generate_async(prompt, model_name, json_mode))
     except Exception as e:
         print(f"Error with Gemini API: {str(e)}")
         raise
 
-def _stream_gemini(prompt: str, model_name: str = None) -> Generator[str, None, None]:
+def _stream_gemini(prompt: str, model_name: str = None) -> Generator[Tuple[str, object], None, None]:
     """
     Stream response from Gemini API.
-    Yields text chunks as they are generated.
+    Yields (text, usage_metadata) for each chunk as it is generated; either may be empty.
     """
     try:
-        model_name = model_name or DEFAULT_MODEL
-        config = MODEL_CONFIGS.get(model_name, next(iter(MODEL_CONFIGS.values())))
-        
-        model = genai.GenerativeModel(
-            model_name=config["model"],
-            generation_config={
-                "temperature": config["temperature"],
-                "top_p": config["top_p"],
-                "top_k": config["top_k"],
-                "max_output_tokens": config["max_output_tokens"],
-            },
-        )
-        
-        response = model.generate_content(prompt, stream=True)
-        
-        for chunk in response:
-            if chunk.text:
-                yield chunk.text
-                
+        if COOPERATIVE:
+            yield from _stream_cooperative(prompt, model_name)
+        else:
+            yield from _runner.iterate(_stream_async(prompt, model_name))
     except Exception as e:
         print(f"Error with Gemini API streaming: {str(e)}")
         raise
 
 # Public API functions
-def ask_ai(prompt: str, model: str = None, json_mode: bool = False) -> Tuple[str, int]:
+def ask_ai(prompt: str, model: str = None, json_mode: bool = False, cache: bool = False) -> Tuple[str, int]:
     """
     Sends a prompt to the specified Gemini model.
-    Returns a tuple: (text_response, estimated_tokens_used)
+    With cache=True the response is looked up in the response cache first; use it only
+    for prompts whose output is a pure function of the prompt. Cache hits cost 0 tokens.
+    Returns a tuple: (text_response, total_tokens_used); the prompt/output split, latency and
+    whether the counts are estimated are available from last_ai_call().
+    """
+    model_name, config = _resolve_config(model)
+    started = time.perf_counter()
+    response_cache = get_response_cache() if cache else None
+    key = make_cache_key(model_name, dict(config, json_mode=json_mode), prompt) if response_cache else None
+    cached = response_cache.get(key) if response_cache else None
+    if cached is not None:
+        _last_call.set(AICall(model_name, 0, 0, 0, 0, True, False))
+        return cached[0], 0
+
+    text, usage = _call_gemini(prompt, model, json_mode)
+    _last_call.set(AICall(model_name, usage.prompt_tokens, usage.output_tokens, usage.total_tokens,
+                          int((time.perf_counter() - started) * 1000), False, usage.estimated))
+    if response_cache and text and "Error:" not in text:
+        response_cache.set(key, text, usage.total_tokens)
+    return text, usage.total_tokens
+
+class AIStream:
+    """
+    Iterator over the text chunks of a streamed response. Once it is exhausted, closed or has
+    failed, .call holds the AICall with the usage the final chunk reported, or an estimate from
+    what was received (also returned by last_ai_call()).
     """
-    return _call_gemini(prompt, model, json_mode)
 
-def ask_ai_stream(prompt: str, model: str = None) -> Generator[str, None, None]:
+    def __init__(self, prompt: str, model: str = None):
+        self.call: Optional[AICall] = None
+        self._chunks = self._generate(prompt, model)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        return next(self._chunks)
+
+    def close(self):
+        """Stop reading the response, e.g. because the client went away."""
+        self._chunks.close()
+
+    def _generate(self, prompt: str, model: str = None) -> Generator[str, None, None]:
+        model_name, _ = _resolve_config(model)
+        started = time.perf_counter()
+        usage_metadata, output_chars = None, 0
+        try:
+            for text, metadata in _stream_gemini(prompt, model):
+                # Counts are cumulative; the last chunk that reports them has the totals
+                usage_metadata = metadata or usage_metadata
+                if text:
+                    output_chars += len(text)
+                    yield text
+        finally:
+            # Also when the stream fails or is closed early: what was generated until then is paid for
+            usage = _usage(usage_metadata, len(prompt), output_chars)
+            self.call = AICall(model_name, usage.prompt_tokens, usage.output_tokens, usage.total_tokens,
+                               int((time.perf_counter() - started) * 1000), False, usage.estimated)
+            _last_call.set(self.call)
+
+def ask_ai_stream(prompt: str, model: str = None) -> AIStream:
     """
     Sends a prompt to the specified Gemini model and streams the response.
-    Yields text chunks as they are generated.
+    Iterating yields text chunks as they are generated; the usage is in .call afterwards.
     """
-    yield from _stream_gemini(prompt, model)
+    return AIStream(prompt, model)
 
 # Backward compatibility
-def ask_gemini(prompt: str, json_mode: bool = False) -> Tuple[str, int]:
-    return ask_ai(prompt, None, json_mode)
+def ask_gemini(prompt: str, json_mode: bool = False, cache: bool = False) -> Tuple[str, int]:
+    return ask_ai(prompt, None, json_mode, cache)
 
-def ask_gemini_stream(prompt: str) -> Generator[str, None, None]:
+def ask_gemini_stream(prompt: str) -> AIStream:
     return ask_ai_stream(prompt, None)
\ No newline at end of file
@@ -0,0 +1,126 @@
+import os
+import queue
+import asyncio
+import threading
+import google.generativeai as genai
+from typing import Any, AsyncIterator, Awaitable, Dict, Generator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Upper bound on generations in flight on the shared event loop (per process)
+MAX_CONCURRENT_REQUESTS = int(os.getenv("AI_MAX_CONCURRENT_REQUESTS", 32))
+
+
+def cooperative_runtime() -> bool:
+    """True when running under gevent monkey-patching (e.g. gunicorn's gevent worker class)."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+class ModelPool:
+    """
+    Caches one GenerativeModel per (model name, generation config).
+    GenerativeModel objects are immutable once built, so they are safe to share between requests.
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple, genai.GenerativeModel] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str, generation_config: Dict[str, Any]) -> genai.GenerativeModel:
+        key = (model_name, tuple(sorted(generation_config.items())))
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+                    self._models[key] = model
+        return model
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+class AsyncLoopRunner:
+    """
+    Runs one asyncio event loop in a background thread and lets synchronous code submit work to it.
+    All in-flight generations of a process share this loop instead of holding a thread each.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_REQUESTS):
+        self._max_concurrency = max_concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # Gunicorn forks workers after the app is imported; a loop thread started
+        # in the parent does not exist in the child, so start one per process.
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="ai-event-loop", daemon=True)
+                    thread.start()
+                    self._semaphore = asyncio.Semaphore(self._max_concurrency)
+                    self._loop = loop
+                    self._pid = os.getpid()
+        return self._loop
+
+    async def _bounded(self, awaitable: Awaitable[T]) -> T:
+        async with self._semaphore:
+            return await awaitable
+
+    def run(self, awaitable: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the shared loop and block the calling thread until it finishes."""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._bounded(awaitable), loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, aiterator: AsyncIterator[T]) -> Generator[T, None, None]:
+        """
+        Drain an async iterator on the shared loop and yield its items to the calling thread.
+        Closing the generator early (e.g. client disconnect) cancels the upstream stream.
+        """
+        loop = self._ensure_loop()
+        items: "queue.Queue[Any]" = queue.Queue()
+
+        async def pump():
+            async with self._semaphore:
+                try:
+                    async for item in aiterator:
+                        items.put(item)
+                except Exception as e:
+                    items.put(_Failure(e))
+                finally:
+                    items.put(_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        try:
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            future.cancel()
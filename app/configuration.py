@@ -8,6 +8,9 @@ import math
 import os
 from datetime import timedelta
 from pathlib import Path
+from app.db_utils import dumps_json
+from app.query_stats import init_query_stats
+from app.session_backend import SqlSessionInterface
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -26,10 +29,26 @@ if os.environ.get('DATABASE_URL'):
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///quillio.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # Per-process connection pool; raise it for the gevent worker class, where one process serves many requests
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        # JSONB values are encoded with msgspec, like the JSON text columns on SQLite
+        'json_serializer': dumps_json,
+    }
 
 # Session config
 app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
+# Server-side session store: sqlalchemy (default; shared by every instance through the database),
+# cachelib (in-process, single instance only) or filesystem
+app.config["SESSION_TYPE"] = os.getenv('SESSION_BACKEND', 'sqlalchemy')
+if os.getenv('SESSION_CLEANUP_N_REQUESTS'):
+    # Workers sweep expired sessions; this additionally sweeps from web requests
+    app.config['SESSION_CLEANUP_N_REQUESTS'] = int(os.getenv('SESSION_CLEANUP_N_REQUESTS'))
+
+# Background jobs: external URL used when jobs build absolute links outside a real request
+app.config['JOB_BASE_URL'] = os.getenv('APP_BASE_URL', 'http://localhost:8000')
 
 # Email config
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER')
@@ -56,12 +75,25 @@ db = SQLAlchemy()
 migrate = Migrate()
 csrf = CSRFProtect()
 login_manager = LoginManager()
-Session(app)
 
 db.init_app(app)
+
+# Server-side session store. The SQL one is app.session_backend's, not Flask-Session's, which would
+# create its table on import and commit through db.session
+if app.config['SESSION_TYPE'] == 'sqlalchemy':
+    app.session_interface = SqlSessionInterface(
+        app, db, permanent=app.config['SESSION_PERMANENT'],
+        cleanup_n_requests=app.config.get('SESSION_CLEANUP_N_REQUESTS'))
+else:
+    if app.config['SESSION_TYPE'] == 'cachelib':
+        from cachelib import SimpleCache
+        app.config['SESSION_CACHELIB'] = SimpleCache(threshold=int(os.getenv('SESSION_CACHE_MAX_ENTRIES', 10000)))
+    Session(app)
+
 migrate.init_app(app, db)
 csrf.init_app(app)
 login_manager.init_app(app)
+init_query_stats(app)
 login_manager.login_view = 'login'
 login_manager.refresh_view = 'login'
 login_manager.needs_refresh_message = u"Session timed out, please re-login"
@@ -122,4 +154,8 @@ from app import models
 from app.routes import blueprints
 
 for bp in blueprints:
-    app.register_blueprint(bp)
\ No newline at end of file
+    app.register_blueprint(bp)
+
+# Write buffered token usage at the end of each request
+from app.services.usage_services import init_token_usage
+init_token_usage(app)
\ No newline at end of file
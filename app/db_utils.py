@@ -1,43 +1,139 @@
-from sqlalchemy import types, event
+from sqlalchemy import types, event, func, cast, literal, update, inspect, String
+from sqlalchemy.dialects.postgresql import JSONB, array
 from sqlalchemy.engine import Engine
-import json
+from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.orm import object_session
+import msgspec
+import zlib
+
+_json_encoder = msgspec.json.Encoder()
+_json_decoder = msgspec.json.Decoder()
+
+
+def dumps_json(value):
+    return _json_encoder.encode(value).decode()
+
+
+def loads_json(value):
+    return _json_decoder.decode(value)
+
 
 class JSONEncodedDict(types.TypeDecorator):
     """Represents an immutable structure as a json-encoded string."""
     impl = types.Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None:
+            value = dumps_json(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            value = loads_json(value)
+        return value
+
+# Values stored by CompressedText start with one of these format bytes
+TEXT_RAW = b'\x00'
+TEXT_ZLIB_V1 = b'\x01'
+
+# Preset dictionary for zlib: markup and phrasing that recurs across generated lessons, most frequent last
+# (zlib finds nearer matches more cheaply). Never edit it in place: stored values depend on it byte for
+# byte. To improve it, add TEXT_ZLIB_V2 with a new dictionary and keep decoding V1.
+LESSON_HTML_DICTIONARY_V1 = "".join([
+    '<table>\n<thead>\n<tr>\n<th>', '</th>\n</tr>\n</thead>\n<tbody>\n<tr>\n<td>', '</td>\n<td>',
+    '</td>\n</tr>\n</tbody>\n</table>\n', '<pre><code class="language-python">', '</code></pre>\n',
+    '<pre><code>', '<blockquote>\n<p>', '</p>\n</blockquote>\n', '<details>\n<summary>', '</summary>\n',
+    '<h1>', '</h1>\n', '<h4>', '</h4>\n', '<em>', '</em>', '<code>', '</code>', '$$', '\\frac{',
+    ' Далее: <a href="/loading/lesson/', ' Next up: <a href="/loading/unit_test/',
+    '<hr />\n<h3>👉 Next up: <a href="/loading/lesson/', '</a></h3>',
+    '<p><i>[Image Prompt: "A grayscale, schematic-style diagram with no text, showing ', '"]</i></p>\n',
+    'Key Takeaways', 'Summary', 'Conclusion', 'Introduction', 'Example:', 'Exercise', 'Practice',
+    'for example, ', 'In this lesson, you will learn ', 'Let\'s ', ' the ', ' and ', ' of the ', ' to ',
+    '<p><strong>Estimated Completion Time:</strong> ', ' minutes</p>\n',
+    '<h2>Lesson ', '</h2>\n<p><strong>Unit ', '</strong></p>\n<p><strong>Course: ',
+    '</li>\n</ol>\n', '<ol>\n<li>', '</li>\n</ul>\n<p>', '<h3>', '</h3>\n<p>', '<h2>', '</h2>\n<p>',
+    '</p>\n<ul>\n<li><strong>', ':</strong> ', '.</p>\n<p>', '</strong></p>\n<p>',
+    '.</li>\n<li><strong>', '</p>\n<p><strong>', '</li>\n<li>', '</strong> ', '</p>\n<p>',
+]).encode('utf-8')
+
+
+def compress_text(text):
+    """Encode text for CompressedText storage: zlib with the lesson dictionary, or raw if that doesn't help."""
+    raw = text.encode('utf-8')
+    compressor = zlib.compressobj(9, zdict=LESSON_HTML_DICTIONARY_V1)
+    compressed = compressor.compress(raw) + compressor.flush()
+    if len(compressed) < len(raw):
+        return TEXT_ZLIB_V1 + compressed
+    return TEXT_RAW + raw
+
+
+def decompress_text(data):
+    data = bytes(data)
+    fmt, body = data[:1], data[1:]
+    if fmt == TEXT_ZLIB_V1:
+        decompressor = zlib.decompressobj(zdict=LESSON_HTML_DICTIONARY_V1)
+        return (decompressor.decompress(body) + decompressor.flush()).decode('utf-8')
+    if fmt == TEXT_RAW:
+        return body.decode('utf-8')
+    raise ValueError(f"Unknown compressed text format {fmt!r}")
+
+
+class CompressedText(types.TypeDecorator):
+    """Large text stored compressed (BLOB / bytea). Transparent to the application: str in, str out."""
+    impl = types.LargeBinary
+    cache_ok = True
 
     def process_bind_param(self, value, dialect):
         if value is not None:
-            value = json.dumps(value)
+            value = compress_text(value)
         return value
 
     def process_result_value(self, value, dialect):
         if value is not None:
-            value = json.loads(value)
+            value = decompress_text(value)
         return value
 
-def get_json_type():
+
+def get_json_type(mutable=False):
     """
-    Returns a JSON type that works with the current database.
-    Uses JSONB for PostgreSQL, falls back to Text type with JSON serialization for other databases.
+    Returns a JSON type that works with any database: JSONB on PostgreSQL, JSON-encoded text elsewhere.
+    With mutable=True, in-place changes to the top-level keys of a loaded dict are tracked and saved.
     """
-    from sqlalchemy import create_engine
-    from sqlalchemy.engine.url import make_url
-    
-    # Get the database URL from environment variable or use default SQLite
-    import os
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    db_url = os.environ.get('DATABASE_URL', 'sqlite:///quillio.db')
-    
-    if 'postgresql' in db_url:
-        try:
-            from sqlalchemy.dialects.postgresql import JSONB
-            return JSONB
-        except ImportError:
-            return JSONEncodedDict
-    return JSONEncodedDict
+    json_type = JSONEncodedDict().with_variant(JSONB(), 'postgresql')
+    if mutable:
+        return MutableDict.as_mutable(json_type)
+    return json_type
+
+
+def _json_key_expression(column, key, value, dialect_name):
+    """column with key set to value, as a SQL expression for the given dialect."""
+    encoded = dumps_json(value)
+    if dialect_name == 'postgresql':
+        # Bound as text and cast in SQL: a JSONB parameter would be JSON-encoded a second time
+        return func.jsonb_set(column, array([key]), cast(literal(encoded, String), JSONB))
+    return func.json_set(column, f'$."{key}"', func.json(encoded))
+
+
+def update_json_key(instance, attr, key, value):
+    """
+    Set one top-level key of a model's JSON column with a targeted UPDATE (json_set on SQLite, jsonb_set on
+    PostgreSQL) instead of rewriting the whole document. The loaded value is updated to match without being
+    marked dirty. Does not commit.
+    """
+    session = object_session(instance)
+    mapper = inspect(instance).mapper
+    column = mapper.columns[attr]
+    expression = _json_key_expression(column, key, value, session.get_bind(mapper).dialect.name)
+    session.execute(
+        update(mapper.local_table)
+        .where(*[c == v for c, v in zip(mapper.primary_key, mapper.primary_key_from_instance(instance))])
+        .values({column.name: expression})
+    )
+    loaded = getattr(instance, attr)
+    if loaded is not None:
+        dict.__setitem__(loaded, key, value)
+
 
 # This enables JSON1 extension for SQLite if available
 @event.listens_for(Engine, 'connect')
@@ -1,18 +1,13 @@
 import os
 import PyPDF2
 from werkzeug.utils import secure_filename
-from flask_login import current_user
 from app.ai_clients import ask_ai
 from models.prompt_builders import CoursePromptBuilder
 from models.json_extractor import JsonExtractor
-from app.models import db, Course, Lesson
-
-
-def _update_token_count(tokens_to_add):
-    """Helper function to add tokens to the current user's total."""
-    if tokens_to_add > 0:
-        current_user.tokens_used += tokens_to_add
-        db.session.commit()
+from app.models import db
+from app.services.prefetch_services import schedule_lesson_prefetch
+from app.services.outline_services import materialize_course
+from app.services.usage_services import record_token_usage
 
 
 def extract_text_from_pdf(file_path):
@@ -130,8 +125,8 @@ def create_course_from_file_service(file, user, instructions='', include_backgro
     
     # Generate course title from content
     title_prompt = f"Based on this content, generate a concise course title (max 8 words):\n\n{extracted_text[:1000]}..."
-    course_title, tokens = ask_ai(title_prompt, model="gpt-4o")
-    _update_token_count(tokens)
+    course_title, tokens = ask_ai(title_prompt, model="gpt-4o", cache=True)
+    record_token_usage('file_course_title', tokens)
     
     if "Error:" in course_title:
         course_title = "Course from Uploaded Document"
@@ -145,7 +140,7 @@ def create_course_from_file_service(file, user, instructions='', include_backgro
     )
     
     raw_output, tokens = ask_ai(prompt, model="gpt-4o", json_mode=True)
-    _update_token_count(tokens)
+    record_token_usage('file_course_outline', tokens)
     
     if not raw_output or "Error:" in raw_output:
         return None, f"AI failed to generate course structure. Response: {raw_output}"
@@ -156,26 +151,10 @@ def create_course_from_file_service(file, user, instructions='', include_backgro
         # Override title with generated one
         course_json['course_title'] = course_title.strip('"')
         
-        # Create course in database
-        new_course = Course(
-            user_id=user.id,
-            course_title=course_json['course_title'],
-            course_data=course_json
-        )
-        db.session.add(new_course)
-        db.session.commit()
-        
-        # Create lesson entries
-        for unit in course_json.get('units', []):
-            for lesson_data in unit.get('lessons', []):
-                new_lesson = Lesson(
-                    course_id=new_course.id,
-                    unit_title=unit['unit_title'],
-                    lesson_title=lesson_data['lesson_title']
-                )
-                db.session.add(new_lesson)
-        
+        # Create the course with its lesson entries
+        new_course = materialize_course(user.id, course_json['course_title'], course_json)
         db.session.commit()
+        schedule_lesson_prefetch(new_course, user)
         return new_course, None
         
     except Exception as e:
@@ -0,0 +1,177 @@
+"""
+Database-backed background job queue.
+
+Web requests enqueue work with enqueue(); worker.py (or a thread started with
+start_worker_thread() in local development) claims queued rows one at a time and
+runs the registered handler. Because the queue is a regular table, a local SQLite
+database is enough to run it.
+"""
+
+import os
+import time
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask_login import login_user
+from sqlalchemy import update
+from app.configuration import db
+from app.models import Job, User
+
+POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+# Jobs left 'running' for longer than this (e.g. the worker was killed) are requeued
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', 600))
+MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+# Finished jobs are kept this long so clients can still poll their result
+JOB_RETENTION = timedelta(days=int(os.getenv('JOB_RETENTION_DAYS', 7)))
+MAINTENANCE_INTERVAL = 300
+
+JOB_HANDLERS = {}
+MAINTENANCE_TASKS = []
+
+
+def job_handler(kind):
+    """Register a function as the handler for a job kind. Handlers receive the payload and return a JSON-able result."""
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+
+def maintenance_task(f):
+    """Register a function to be run periodically by workers between jobs."""
+    MAINTENANCE_TASKS.append(f)
+    return f
+
+
+def enqueue(kind, payload, user_id=None):
+    """Queue a job and commit it so a worker can pick it up immediately."""
+    job = Job(kind=kind, payload=payload, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def get_job_for_user(job_id, user_id):
+    return Job.query.filter_by(id=job_id, user_id=user_id).first()
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to 'running' and return it, or None if the queue is empty."""
+    while True:
+        job_id = db.session.query(Job.id).filter_by(status='queued').order_by(Job.created_at).limit(1).scalar()
+        if job_id is None:
+            return None
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == 'queued')
+            .values(status='running', started_at=datetime.utcnow(), attempts=Job.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+        # Another worker claimed it first; try the next one
+
+
+def requeue_stale_jobs():
+    """Return jobs abandoned by a dead worker to the queue, or fail them once they run out of attempts."""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_TIMEOUT)
+    stale = Job.query.filter(Job.status == 'running', Job.started_at < cutoff).all()
+    for job in stale:
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = 'failed'
+            job.error = 'Job timed out'
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = 'queued'
+    if stale:
+        db.session.commit()
+    return len(stale)
+
+
+@maintenance_task
+def purge_finished_jobs():
+    cutoff = datetime.utcnow() - JOB_RETENTION
+    deleted = Job.query.filter(Job.status.in_(('done', 'failed')), Job.finished_at < cutoff).delete(
+        synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+maintenance_task(requeue_stale_jobs)
+
+
+@contextmanager
+def user_request_context(app, user_id):
+    """
+    Push a request context logged in as the given user, so services that rely on current_user
+    and url_for behave outside a real request (jobs, background generation threads).
+    """
+    with app.test_request_context(base_url=app.config.get('JOB_BASE_URL')):
+        if user_id:
+            user = db.session.get(User, user_id)
+            if user:
+                login_user(user)
+        yield
+
+
+def run_job(app, job):
+    handler = JOB_HANDLERS.get(job.kind)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job kind '{job.kind}'")
+        with user_request_context(app, job.user_id):
+            result = handler(job.payload)
+        job.result = result
+        job.status = 'done'
+    except Exception as e:
+        db.session.rollback()
+        print(f"[JOB] {job.kind} {job.id} failed: {e}")
+        traceback.print_exc()
+        job.error = str(e)
+        job.status = 'failed'
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    print(f"[JOB] {job.kind} {job.id} {job.status} in {time.perf_counter() - started:.2f}s")
+    return job
+
+
+def run_maintenance():
+    """Periodic housekeeping done by workers between jobs."""
+    for task in MAINTENANCE_TASKS:
+        try:
+            task()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[JOB] Maintenance task {task.__name__} failed: {e}")
+
+
+def run_worker(app, poll_interval=POLL_INTERVAL, stop_event=None):
+    """Process jobs until stop_event is set (or forever)."""
+    print(f"[JOB] Worker started (pid {os.getpid()})")
+    last_maintenance = 0.0
+    while not (stop_event and stop_event.is_set()):
+        with app.app_context():
+            try:
+                if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                    run_maintenance()
+                    last_maintenance = time.monotonic()
+                job = claim_next_job()
+                if job is not None:
+                    run_job(app, job)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[JOB] Worker error: {e}")
+                job = None
+            finally:
+                db.session.remove()
+        if job is None:
+            time.sleep(poll_interval)
+
+
+def start_worker_thread(app):
+    """Run a worker in a daemon thread of the current process (local development)."""
+    thread = threading.Thread(target=run_worker, args=(app,), name='job-worker', daemon=True)
+    thread.start()
+    return thread
@@ -1,76 +1,120 @@
 from app.configuration import db, login_manager
-from app.db_utils import get_json_type
+from app.db_utils import get_json_type, CompressedText
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
-from sqlalchemy.types import TypeDecorator, CHAR
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.types import TypeDecorator, CHAR, BINARY
+from functools import lru_cache
+import os
 import uuid
+import hashlib
 import secrets
 import random
 from datetime import datetime, timedelta
 import jwt
 from flask import current_app
 
+# How GUID columns are stored on SQLite: 'text' (32 hex characters, the default) or 'blob' (16 raw bytes).
+# Only databases created with db.create_all() pick this up; migrated databases keep text columns.
+SQLITE_UUID_STORAGE = os.getenv('SQLITE_UUID_STORAGE', 'text')
+
+
+@lru_cache(maxsize=4096)
+def _parse_uuid(value):
+    """UUID from a string (32 hex digits or dashed form). Cached: the same foreign keys load over and over."""
+    return uuid.UUID(value)
+
+
+@lru_cache(maxsize=4096)
+def _uuid_from_bytes(value):
+    return uuid.UUID(bytes=value)
+
+
 class GUID(TypeDecorator):
     """Platform-independent GUID type.
     Uses PostgreSQL's UUID type, otherwise uses
-    CHAR(32), storing as stringified hex values.
+    CHAR(32), storing as stringified hex values
+    (or BINARY(16) on SQLite with SQLITE_UUID_STORAGE=blob).
     """
     impl = CHAR
     cache_ok = True
 
+    def __init__(self, binary=None):
+        super().__init__()
+        self.binary = SQLITE_UUID_STORAGE == 'blob' if binary is None else binary
+
+    def _stores_bytes(self, dialect):
+        return self.binary and dialect.name == 'sqlite'
+
     def load_dialect_impl(self, dialect):
         if dialect.name == 'postgresql':
             return dialect.type_descriptor(PostgresUUID())
-        else:
-            return dialect.type_descriptor(CHAR(32))
+        if self._stores_bytes(dialect):
+            return dialect.type_descriptor(BINARY(16))
+        return dialect.type_descriptor(CHAR(32))
 
     def process_bind_param(self, value, dialect):
-        if value is None:
-            return None
-            
-        # Convert to UUID if it's a string
+        if value is None or isinstance(value, uuid.UUID):
+            return None if value is None else str(value)
         if isinstance(value, str):
             try:
-                # Try to convert from hex string if it's a valid UUID hex
-                if len(value) == 32 and all(c in '0123456789abcdef' for c in value.lower()):
-                    value = uuid.UUID(hex=value)
-                else:
-                    # Try to convert from standard UUID string
-                    value = uuid.UUID(value)
-            except (ValueError, AttributeError):
-                # If it's not a valid UUID string, treat it as a regular string ID
+                return str(_parse_uuid(value))
+            except ValueError:
+                # Not a UUID string; let the database compare it as is
                 return value
-        
-        # Handle UUID object
-        if isinstance(value, uuid.UUID):
-            if dialect.name == 'postgresql':
-                return str(value)
-            return "%.32x" % value.int
-            
-        # Fallback for other types (like integer IDs)
         return value
 
     def process_result_value(self, value, dialect):
-        if value is None:
-            return value
-            
-        # If it's already a UUID, return as is
-        if isinstance(value, uuid.UUID):
+        if value is None or isinstance(value, uuid.UUID):
             return value
-            
-        # If it's a 32-character hex string (SQLite)
-        if isinstance(value, str) and len(value) == 32 and all(c in '0123456789abcdef' for c in value.lower()):
-            return uuid.UUID(hex=value)
-            
         try:
-            # Try to convert from standard UUID string (PostgreSQL)
-            return uuid.UUID(str(value))
-        except (ValueError, AttributeError, TypeError):
-            # If all else fails, return the value as is
+            return _parse_uuid(str(value))
+        except ValueError:
             return value
 
+    # The methods above serve PostgreSQL, whose driver does its own conversion. Everywhere else these
+    # processors run once per bound value and per loaded row, so they skip the generic TypeDecorator
+    # plumbing and the CHAR/BINARY impl processors and convert directly.
+
+    def bind_processor(self, dialect):
+        if dialect.name == 'postgresql':
+            return super().bind_processor(dialect)
+        as_bytes = self._stores_bytes(dialect)
+
+        def process(value):
+            if value is None:
+                return None
+            if not isinstance(value, uuid.UUID):
+                if not isinstance(value, str):
+                    return value
+                try:
+                    value = _parse_uuid(value)
+                except ValueError:
+                    return value
+            return value.bytes if as_bytes else value.hex
+        return process
+
+    def result_processor(self, dialect, coltype):
+        if dialect.name == 'postgresql':
+            return super().result_processor(dialect, coltype)
+
+        def process(value):
+            if value is None:
+                return None
+            try:
+                if isinstance(value, bytes):
+                    return _uuid_from_bytes(value)
+                return _parse_uuid(value)
+            except (ValueError, TypeError):
+                return value
+        return process
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
@@ -161,20 +205,120 @@ class Course(db.Model):
     id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
     user_id = db.Column(GUID(), db.ForeignKey('users.id'), nullable=False)
     course_title = db.Column(db.String(200), nullable=False)
-    course_data = db.Column(get_json_type(), nullable=False)
+    # The whole outline; deferred so listings and lookups by id don't read it unless it is used
+    course_data = db.deferred(db.Column(get_json_type(mutable=True), nullable=False))
     status = db.Column(db.String(50), nullable=False, default='active')
     completed_lessons = db.Column(db.Integer, nullable=False, default=0)
+    # Kept in step with the course's lesson rows by app.services.progress_services
+    total_lessons = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     user = db.relationship('User', backref=db.backref('courses', lazy=True, cascade='all, delete-orphan'))
 
+    # Dashboard: a user's courses by status
+    __table_args__ = (db.Index('ix_courses_user_id_status', 'user_id', 'status'),)
+
+    @property
+    def is_complete(self):
+        return self.total_lessons > 0 and self.completed_lessons >= self.total_lessons
+
+class Unit(db.Model):
+    """A unit of a course outline. Rows are derived from Course.course_data by app.services.outline_services."""
+    __tablename__ = 'units'
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
+    course_id = db.Column(GUID(), db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    unit_title = db.Column(db.String, nullable=False)
+    test_title = db.Column(db.String, nullable=True)
+    course = db.relationship('Course', backref=db.backref('units', lazy=True, order_by='Unit.position',
+                                                          cascade='all, delete-orphan'))
+
+    __table_args__ = (db.Index('ix_units_course_id_position', 'course_id', 'position'),)
+
+class LessonContent(db.Model):
+    """Generated lesson HTML, stored once per distinct content and shared by every lesson that has it."""
+    __tablename__ = 'lesson_contents'
+    hash = db.Column(db.String(64), primary_key=True)
+    html = db.Column(CompressedText(), nullable=False)
+    # Length of the HTML before compression
+    size = db.Column(db.Integer, nullable=False, default=0)
+    # Last time the content was stored, including reuse of an existing row; see ORPHAN_GRACE
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @staticmethod
+    def hash_html(html):
+        return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def store(cls, html):
+        """Save the HTML unless identical content is already stored, and return the stored instance."""
+        digest = cls.hash_html(html)
+        now = datetime.utcnow()
+        insert = postgresql_insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite_insert
+        # Reusing a stored row renews created_at, so the orphan purge's grace period protects it
+        # until the lesson that is about to refer to it commits
+        db.session.execute(insert(cls).values(hash=digest, html=html, size=len(html), created_at=now)
+                           .on_conflict_do_update(index_elements=['hash'], set_={'created_at': now}))
+        # The row exists now; attach it without reading the HTML back
+        content = cls(hash=digest, html=html, size=len(html))
+        make_transient_to_detached(content)
+        return db.session.merge(content, load=False)
+
+class LessonArtifact(db.Model):
+    """
+    Compact forms of one LessonContent, derived once in the background by app.services.artifact_services:
+    plain text, a short summary and key concepts, with token estimates. Shared like the content itself.
+    """
+    __tablename__ = 'lesson_artifacts'
+    content_hash = db.Column(db.String(64), db.ForeignKey('lesson_contents.hash', ondelete='CASCADE'), primary_key=True)
+    # The lesson's text blocks, one per line, without markup or navigation
+    plain_text = db.Column(CompressedText(), nullable=False)
+    summary = db.Column(db.Text, nullable=True)
+    key_concepts = db.Column(get_json_type(), nullable=False, default=list)
+    html_tokens = db.Column(db.Integer, nullable=False, default=0)
+    text_tokens = db.Column(db.Integer, nullable=False, default=0)
+    summary_tokens = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @property
+    def text_blocks(self):
+        return tuple(self.plain_text.split('\n')) if self.plain_text else ()
+
 class Lesson(db.Model):
     __tablename__ = 'lessons'
     id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
     course_id = db.Column(GUID(), db.ForeignKey('courses.id'), nullable=False)
+    unit_id = db.Column(GUID(), db.ForeignKey('units.id', ondelete='SET NULL'), nullable=True)
+    # Order of the lesson within the whole course; None for lessons no longer in the outline
+    position = db.Column(db.Integer, nullable=True)
     unit_title = db.Column(db.String, nullable=False)
     lesson_title = db.Column(db.String, nullable=False)
-    html_content = db.Column(db.Text, nullable=True)
+    # Lessons with identical content share one LessonContent row; copying a lesson copies the reference
+    content_hash = db.Column(db.String(64), db.ForeignKey('lesson_contents.hash'), nullable=True)
     is_completed = db.Column(db.Boolean, default=False, nullable=False)
     course = db.relationship('Course', backref=db.backref('lessons', lazy=True, cascade="all, delete-orphan"))
+    unit = db.relationship('Unit', backref=db.backref('lessons', lazy=True, order_by='Lesson.position'))
+    # Loaded on first access only; use selectinload(Lesson.content) when reading the HTML of many lessons
+    content = db.relationship('LessonContent', lazy='select')
+
+    @hybrid_property
+    def html_content(self):
+        return self.content.html if self.content is not None else None
+
+    @html_content.setter
+    def html_content(self, html):
+        self.content = LessonContent.store(html) if html is not None else None
+
+    @html_content.expression
+    def html_content(cls):
+        return select(LessonContent.html).where(LessonContent.hash == cls.content_hash).scalar_subquery()
+
+    # Every index leads with course_id, so plain "lessons of a course" lookups use them too
+    __table_args__ = (
+        db.Index('ix_lessons_course_id_lesson_title', 'course_id', 'lesson_title'),
+        db.Index('ix_lessons_course_id_unit_title', 'course_id', 'unit_title'),
+        db.Index('ix_lessons_course_id_is_completed', 'course_id', 'is_completed'),
+        db.Index('ix_lessons_course_id_position', 'course_id', 'position'),
+        db.Index('ix_lessons_content_hash', 'content_hash'),
+    )
 
 class UnitTestResult(db.Model):
     __tablename__ = 'unit_test_results'
@@ -202,11 +346,163 @@ class CourseShare(db.Model):
     # Relationships
     course = db.relationship('Course', backref=db.backref('shares', lazy=True))
     created_by_user = db.relationship('User', backref=db.backref('shared_courses', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_course_shares_course_id_token', 'course_id', 'token'),
+        db.Index('ix_course_shares_course_id_created_by', 'course_id', 'created_by'),
+    )
     
     def is_valid(self):
         return self.is_active and datetime.utcnow() < self.expires_at
 
 
+class LessonGeneration(db.Model):
+    """Tracks the in-flight (or last) content generation of a lesson so that streams can be shared and resumed."""
+    __tablename__ = 'lesson_generations'
+    lesson_id = db.Column(GUID(), db.ForeignKey('lessons.id', ondelete='CASCADE'), primary_key=True)
+    attempt = db.Column(db.Integer, nullable=False, default=1)
+    status = db.Column(db.String(20), nullable=False, default='running')
+    chunk_count = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class LessonChunk(db.Model):
+    """One streamed piece of a lesson generation, addressed by its sequence number."""
+    __tablename__ = 'lesson_chunks'
+    lesson_id = db.Column(GUID(), db.ForeignKey('lessons.id', ondelete='CASCADE'), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    content = db.Column(db.Text, nullable=False)
+
+
+class TestAttempt(db.Model):
+    """An in-progress or finished run through a generated test; answers are stored one row per question."""
+    __tablename__ = 'test_attempts'
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
+    user_id = db.Column(GUID(), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'assessment' or 'unit'
+    course_id = db.Column(GUID(), db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=True)
+    unit_title = db.Column(db.String(200), nullable=True)
+    # The generated test, as produced by save_test_to_dict(); only loaded when it is not cached
+    test_data = db.deferred(db.Column(get_json_type(), nullable=False))
+    question_count = db.Column(db.Integer, nullable=False)
+    answer_count = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='in_progress')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_answered(self):
+        return self.answer_count >= self.question_count
+
+
+class TestAnswer(db.Model):
+    __tablename__ = 'test_answers'
+    attempt_id = db.Column(GUID(), db.ForeignKey('test_attempts.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    question = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=False, default='')
+    answer_value = db.Column(db.Text, nullable=False, default='')
+    correct_answer = db.Column(db.Text, nullable=True)
+
+    def to_dict(self):
+        data = {'question': self.question, 'answer': self.answer, 'answer_value': self.answer_value}
+        if self.correct_answer is not None:
+            data['correct_answer'] = self.correct_answer
+        return data
+
+
+class SessionPayload(db.Model):
+    """A large session value kept server-side; the session itself only stores the row id."""
+    __tablename__ = 'session_payloads'
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
+    user_id = db.Column(GUID(), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    data = db.Column(get_json_type(), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class Job(db.Model):
+    """A unit of background work, queued in the database and executed by worker.py."""
+    __tablename__ = 'jobs'
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
+    user_id = db.Column(GUID(), db.ForeignKey('users.id'), nullable=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    payload = db.Column(get_json_type(), nullable=False)
+    result = db.Column(get_json_type(), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_created_at', 'status', 'created_at'),
+        # Per-user pending job and budget checks (e.g. lesson prefetch)
+        db.Index('ix_jobs_user_id_kind_status', 'user_id', 'kind', 'status'),
+    )
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+
+class ChatConversation(db.Model):
+    """
+    A learner's tutor chat about one lesson. Older turns are folded into summary by
+    app.services.tutor_services; messages up to summarized_through are covered by it.
+    """
+    __tablename__ = 'chat_conversations'
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
+    user_id = db.Column(GUID(), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    lesson_id = db.Column(GUID(), db.ForeignKey('lessons.id', ondelete='CASCADE'), nullable=False)
+    summary = db.Column(db.Text, nullable=True)
+    summarized_through = db.Column(db.Integer, nullable=False, default=0)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'lesson_id', name='uq_chat_conversations_user_id_lesson_id'),)
+
+
+class ChatMessage(db.Model):
+    """One turn of a ChatConversation; seq numbers them from 1."""
+    __tablename__ = 'chat_messages'
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(GUID(), db.ForeignKey('chat_conversations.id', ondelete='CASCADE'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    # 'user' or 'ai', as the tutor prompt labels them
+    role = db.Column(db.String(10), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    tokens = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('conversation_id', 'seq', name='uq_chat_messages_conversation_id_seq'),)
+
+
+class TokenUsage(db.Model):
+    """One AI call charged to a user. Append-only; User.tokens_used is the running total of total_tokens."""
+    __tablename__ = 'token_usage'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(GUID(), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    feature = db.Column(db.String(50), nullable=False)
+    model = db.Column(db.String(100), nullable=True)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    output_tokens = db.Column(db.Integer, nullable=False, default=0)
+    # Includes tokens the model spent thinking, which are billed like output but not in output_tokens
+    total_tokens = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # The response reported no usage, so the counts are a characters/4 estimate
+    estimated = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    latency_ms = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_token_usage_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_token_usage_created_at', 'created_at'),
+    )
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(user_id)
\ No newline at end of file
+    return User.query.get(user_id)
@@ -0,0 +1,133 @@
+"""
+Per-request SQL statistics.
+Engine events count the statements each request runs and the time spent in the database.
+Statements repeated with different parameters (the usual sign of an N+1 relationship walk)
+are logged, and in debug mode or with QUERY_STATS_HEADERS on the numbers are returned as X-Query-* headers.
+assert_query_budget() uses the same counters to hold a block of code to a query budget.
+"""
+
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS", "true").lower() == "true"
+QUERY_STATS_HEADERS = os.getenv("QUERY_STATS_HEADERS", "false").lower() == "true"
+# A statement run this many times in one request is reported as a likely N+1
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", 5))
+
+# Every QueryStats currently collecting; nested blocks each see the statements run inside them
+_active: ContextVar[tuple] = ContextVar("query_stats_active", default=())
+
+
+class QueryStats:
+    """Statement count, database time and per-statement repeat counts for one block of work."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD):
+        """(statement, times) for every statement run at least threshold times, most repeated first."""
+        return [(statement, times) for statement, times in self.statements.most_common() if times >= threshold]
+
+
+def _short(statement: str, limit: int = 160) -> str:
+    return " ".join(statement.split())[:limit]
+
+
+@contextmanager
+def track_queries():
+    """Collect the statements run inside the block; yields the QueryStats."""
+    stats = QueryStats()
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, max_repeats: Optional[int] = None):
+    """
+    Fail with AssertionError if the block runs more than max_queries statements, or (with max_repeats)
+    any one statement more than max_repeats times. For checks like
+    `with assert_query_budget(6): client.get(url)`.
+    """
+    with track_queries() as stats:
+        yield stats
+    problems = []
+    if stats.count > max_queries:
+        problems.append(f"{stats.count} queries, budget is {max_queries}")
+    if max_repeats is not None:
+        for statement, times in stats.repeated(max_repeats + 1):
+            problems.append(f"{times}x {_short(statement)}")
+    if problems:
+        listing = "\n".join(f"  {times}x {_short(statement)}" for statement, times in stats.statements.most_common())
+        raise AssertionError("Query budget exceeded: " + "; ".join(problems) + "\n" + listing)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the statement's execution context, not the connection: a statement that raises never
+    # reaches after_cursor_execute, and its start time would stay on the pooled connection
+    if _active.get():
+        context._query_stats_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    active = _active.get()
+    started = getattr(context, "_query_stats_started", None)
+    if not active or started is None:
+        return
+    duration = time.perf_counter() - started
+    for stats in active:
+        stats.record(statement, duration)
+
+
+def init_query_stats(app):
+    """Track the statements of every request of the app."""
+    if not QUERY_STATS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_query_stats():
+        g.query_stats = QueryStats()
+        g.query_stats_token = _active.set(_active.get() + (g.query_stats,))
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = g.get("query_stats")
+        if stats is None:
+            return response
+        for statement, times in stats.repeated():
+            print(f"[SQL] Possible N+1 in {request.endpoint or request.path}: {times}x {_short(statement)}")
+        if QUERY_STATS_HEADERS or app.debug:
+            response.headers["X-Query-Count"] = str(stats.count)
+            response.headers["X-Query-Time-Ms"] = f"{stats.duration * 1000:.1f}"
+            response.headers["X-Query-Max-Repeats"] = str(max(stats.statements.values(), default=0))
+        return response
+
+    @app.teardown_request
+    def _stop_query_stats(exc):
+        token = g.pop("query_stats_token", None)
+        if token is not None:
+            try:
+                _active.reset(token)
+            except ValueError:
+                # Torn down in a different context than the one the request started in
+                _active.set(())
+
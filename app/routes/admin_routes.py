@@ -1,6 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app.admin_utils import admin_required, get_available_models
+from app.ai_clients import response_cache_stats
 from app.models import Course, Lesson
+from app.services import lesson_content_stats, token_usage_by_feature
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -12,6 +14,25 @@ def admin_dashboard():
     return render_template('admin_dashboard.html', models=available_models)
 
 
+@admin_bp.route('/admin/ai_cache_stats')
+@admin_required
+def ai_cache_stats():
+    return jsonify(response_cache_stats())
+
+
+@admin_bp.route('/admin/lesson_content_stats')
+@admin_required
+def lesson_content_stats_view():
+    return jsonify(lesson_content_stats())
+
+
+@admin_bp.route('/admin/token_usage_stats')
+@admin_required
+def token_usage_stats():
+    days = request.args.get('days', 7, type=int)
+    return jsonify({'days': days, 'features': token_usage_by_feature(days)})
+
+
 @admin_bp.route('/admin/regenerate_course_structure/<int:course_id>', methods=['POST'])
 @admin_required
 def admin_regenerate_course_structure(course_id):
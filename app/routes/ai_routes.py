@@ -2,7 +2,7 @@ from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from app.configuration import db
 from app.models import Lesson
-from app.services import get_tutor_response_service, edit_course_service
+from app.services import get_tutor_response_service, edit_course_service, CHAT_MESSAGE_MAX_CHARS
 
 ai_bp = Blueprint('ai', __name__)
 
@@ -17,25 +17,31 @@ def chat_with_tutor():
     if not data:
         return jsonify({"error": "No data provided"}), 400
     lesson_id = data.get('lesson_id')
-    user_question = data.get('message')
-    chat_history = data.get('history', [])
+    user_question = (data.get('message') or '').strip()
     if not lesson_id or not user_question:
         return jsonify({"error": "Missing required fields: lesson_id and message are required"}), 400
+    if len(user_question) > CHAT_MESSAGE_MAX_CHARS:
+        return jsonify({"error": f"Message is too long (at most {CHAT_MESSAGE_MAX_CHARS} characters)"}), 400
     lesson = db.session.get(Lesson, str(lesson_id))
     if not lesson:
         return jsonify({"error": "Lesson not found"}), 404
     if lesson.course.user_id != current_user.id:
         return jsonify({"error": "Unauthorized access to this lesson"}), 403
     try:
-        ai_response_generator = get_tutor_response_service(lesson, chat_history, user_question, current_user)
+        ai_response_generator = get_tutor_response_service(lesson, user_question, current_user)
     except Exception:
         return jsonify({"error": "Failed to generate AI response"}), 500
+    # The prompt is built; don't hold a pooled DB connection for the length of the stream
+    db.session.rollback()
     def generate():
         try:
             for chunk in ai_response_generator:
                 yield chunk
         except Exception:
             yield "I'm sorry, I encountered a technical issue while generating a response. Please try again."
+        finally:
+            # On a client disconnect, let the service store what was answered and record the usage
+            ai_response_generator.close()
     return Response(stream_with_context(generate()), mimetype='text/plain')
 
 
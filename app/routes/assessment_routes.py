@@ -1,17 +1,26 @@
 from flask import Blueprint, render_template, session, redirect, url_for, flash, jsonify, request
 from flask_login import login_required, current_user
 from app.forms import InitialAssessmentForm, AnswerForm
-from app.helpers import save_test_to_dict, load_test_from_dict, render_answer_input
+from app.helpers import render_answer_input
 from app.services import (
     generate_test_service,
     evaluate_answers_service,
-    generate_knowledge_assessment_service,
     calculate_percentage_score_service,
-    create_course_service,
+    start_attempt,
+    get_attempt,
+    get_attempt_test,
+    record_answer,
+    get_attempt_answers,
+    complete_attempt,
+    compact_lessons,
+    lesson_context_texts,
 )
+from app.jobs import enqueue, get_job_for_user
 from app.models import UnitTestResult, Course, Lesson
 from app.configuration import db
+from app.session_store import put_payload, get_payload, pop_payload
 import time
+import uuid
 
 assessment_bp = Blueprint('assessment', __name__)
 
@@ -19,26 +28,23 @@ assessment_bp = Blueprint('assessment', __name__)
 @assessment_bp.route('/assessment', methods=['GET', 'POST'])
 @login_required
 def assessment():
-    if 'test' in session:
-        test = load_test_from_dict(session['test'])
-        current_index = session.get('index', 0)
-        if current_index >= len(test.questions):
+    attempt = get_attempt(session.get('assessment_attempt_id'), current_user.id)
+    if attempt and attempt.status == 'in_progress':
+        current_index = attempt.answer_count
+        if attempt.is_answered:
             return redirect(url_for('assessment.loading', context='results'))
+        test = get_attempt_test(attempt)
         current_question = test.questions[current_index]
         form = AnswerForm()
         form.answer.choices = [(key, value) for key, value in current_question.options.items()]
         if form.validate_on_submit():
-            if 'answers' not in session:
-                session['answers'] = []
             selected_option = next((text for value, text in form.answer.choices if value == form.answer.data), form.answer.data)
-            session['answers'].append({
+            record_answer(attempt, current_index, {
                 'question': current_question.question,
                 'answer': selected_option,
                 'answer_value': form.answer.data
             })
-            session['index'] = current_index + 1
-            session.modified = True
-            if session['index'] < len(test.questions):
+            if current_index + 1 < attempt.question_count:
                 return redirect(url_for('assessment.assessment'))
             else:
                 return redirect(url_for('assessment.loading', context='results'))
@@ -53,9 +59,8 @@ def assessment():
         if not test:
             flash("There was an error generating the test. Please try again.", "danger")
             return redirect(url_for('course.home'))
-        session['test'] = save_test_to_dict(test)
-        session['answers'] = []
-        session['index'] = 0
+        attempt = start_attempt(current_user, test, 'assessment')
+        session['assessment_attempt_id'] = str(attempt.id)
         return redirect(url_for('assessment.assessment'))
     return render_template('assessment.html', form=form)
 
@@ -63,7 +68,7 @@ def assessment():
 @assessment_bp.route('/test_ready')
 @login_required
 def test_ready():
-    if 'test' not in session:
+    if 'assessment_attempt_id' not in session:
         return redirect(url_for('course.home'))
     return render_template('test_ready.html', lang=current_user.language)
 
@@ -71,9 +76,10 @@ def test_ready():
 @assessment_bp.route('/results')
 @login_required
 def show_results():
-    if 'assessed_answers' not in session:
+    results = get_payload('assessment_results')
+    if not results:
         return redirect(url_for('course.home'))
-    return render_template('results.html', answers=session['assessed_answers'], knowledge_assessment=session.get('knowledge_assessment'), course_id=session.get('current_course_id'), lang=current_user.language)
+    return render_template('results.html', answers=results['assessed_answers'], knowledge_assessment=results.get('knowledge_assessment'), score=session.get('assessment_score'), course_id=session.get('current_course_id'), lang=current_user.language)
 
 
 @assessment_bp.route('/loading/<context>')
@@ -96,31 +102,56 @@ def loading(context):
 @assessment_bp.route('/get_results_data')
 @login_required
 def get_results_data():
-    test = load_test_from_dict(session['test'])
-    detailed_results = evaluate_answers_service(test.questions, session['answers'], current_user.language)
-    if not detailed_results:
+    """Queue grading and course generation for the finished assessment; the loading page polls the job."""
+    job = None
+    if 'results_job_id' in session:
+        job = get_job_for_user(session['results_job_id'], current_user.id)
+    if job is None or job.is_finished:
+        attempt = get_attempt(session.get('assessment_attempt_id'), current_user.id)
+        if attempt is None:
+            return jsonify({'redirect_url': url_for('course.home')})
+        job = enqueue('course_from_assessment', {'attempt_id': str(attempt.id)},
+                      user_id=current_user.id)
+        session['results_job_id'] = job.id
+    return jsonify({'job_id': str(job.id), 'poll_url': url_for('assessment.results_status', job_id=job.id)})
+
+
+@assessment_bp.route('/results_status/<uuid:job_id>')
+@login_required
+def results_status(job_id):
+    job = get_job_for_user(job_id, current_user.id)
+    if job is None:
+        return jsonify({'error': 'Job not found', 'redirect_url': url_for('course.home')}), 404
+    if not job.is_finished:
+        return jsonify({'status': job.status})
+
+    session.pop('results_job_id', None)
+    result = job.result or {}
+    outcome = result.get('outcome') if job.status == 'done' else 'course_failed'
+    if outcome == 'evaluation_failed':
         flash("There was an error evaluating your test answers. Please try again.", "danger")
-        for key in ['test', 'answers', 'index']:
-            session.pop(key, None)
-        return jsonify({'redirect_url': url_for('course.home')})
-    knowledge_assessment = generate_knowledge_assessment_service(detailed_results)
-    if "Error:" in knowledge_assessment or "Unauthorized" in knowledge_assessment:
+        session.pop('assessment_attempt_id', None)
+        return jsonify({'status': job.status, 'redirect_url': url_for('course.home')})
+    if outcome == 'assessment_failed':
         flash("Your test was graded, but we could not generate a course. The API key is invalid or your account has billing issues. Please check your credentials.", "danger")
-        session['assessed_answers'] = detailed_results
-        session['knowledge_assessment'] = "Could not be generated due to an API authentication error."
-        for key in ['test', 'answers', 'index', 'current_course_id']:
+        put_payload('assessment_results', {
+            'assessed_answers': result['detailed_results'],
+            'knowledge_assessment': "Could not be generated due to an API authentication error.",
+        })
+        for key in ['assessment_attempt_id', 'current_course_id']:
             session.pop(key, None)
-        return jsonify({'redirect_url': url_for('assessment.show_results')})
-    new_course = create_course_service(current_user, test.topic, knowledge_assessment, detailed_results)
-    if not new_course:
+        return jsonify({'status': job.status, 'redirect_url': url_for('assessment.show_results')})
+    if outcome != 'created':
         flash("We're sorry, but we couldn't create your course at this time. Please try again later.", "danger")
-        return jsonify({'redirect_url': url_for('course.home')})
-    session['assessed_answers'] = detailed_results
-    session['knowledge_assessment'] = knowledge_assessment
-    session['current_course_id'] = new_course.id
-    for key in ['test', 'answers', 'index']:
-        session.pop(key, None)
-    return jsonify({'redirect_url': url_for('assessment.show_results')})
+        return jsonify({'status': job.status, 'redirect_url': url_for('course.home')})
+    put_payload('assessment_results', {
+        'assessed_answers': result['detailed_results'],
+        'knowledge_assessment': result['knowledge_assessment'],
+    })
+    session['assessment_score'] = result.get('score')
+    session['current_course_id'] = uuid.UUID(result['course_id'])
+    session.pop('assessment_attempt_id', None)
+    return jsonify({'status': job.status, 'redirect_url': url_for('assessment.show_results')})
 
 
 @assessment_bp.route('/loading/unit_test/<uuid:course_id>/<unit_title>/<test_title>')
@@ -142,7 +173,7 @@ def get_unit_test_data(course_id, unit_title, test_title):
     course = Course.query.get_or_404(course_id)
     if course.user_id != current_user.id:
         return jsonify({"error": "Unauthorized"}), 403
-    lessons_in_unit = Lesson.query.filter_by(course_id=course_id, unit_title=unit_title).all()
+    lessons_in_unit = Lesson.query.filter_by(course_id=course_id, unit_title=unit_title).order_by(Lesson.position).all()
     incomplete_lessons = [lesson.lesson_title for lesson in lessons_in_unit if not lesson.is_completed]
     if incomplete_lessons:
         lang = current_user.language
@@ -154,18 +185,18 @@ def get_unit_test_data(course_id, unit_title, test_title):
             message += f"Incomplete lessons: {', '.join(incomplete_lessons)}"
         flash(message, "warning")
         return jsonify({'redirect_url': url_for('course.show_course', course_id=course_id)})
-    lesson_content_context = "\n\n".join([lesson.html_content for lesson in lessons_in_unit if lesson.html_content])
+    context = compact_lessons(lesson_context_texts(lessons_in_unit))
+    print(f"[CONTEXT] {unit_title}: {context.original_tokens} -> {context.tokens} tokens "
+          f"({context.ratio}x) in {context.elapsed_ms} ms")
+    lesson_content_context = context.text
     topic = f"{unit_title}: {test_title}"
     user_profile = {'age': current_user.age, 'bio': current_user.bio}
-    test = generate_test_service(topic, "multiple_choice", "Create 5-10 questions.", current_user.language, user_profile=user_profile, lesson_content_context=lesson_content_context)
+    test = generate_test_service(topic, "multiple_choice", "Create 5-10 questions.", current_user.language, user_profile=user_profile, lesson_content_context=lesson_content_context, cache=True)
     if not test:
         flash(f"Could not generate the test for {unit_title}. There may have been an issue with the AI service.", "danger")
         return jsonify({'redirect_url': url_for('course.show_course', course_id=course_id)})
-    session['current_unit_test'] = save_test_to_dict(test)
-    session['current_unit_test_index'] = 0
-    session['current_unit_test_answers'] = []
-    session['current_course_id'] = course_id
-    session['current_unit_title'] = unit_title
+    attempt = start_attempt(current_user, test, 'unit', course_id=course_id, unit_title=unit_title)
+    session['unit_test_attempt_id'] = str(attempt.id)
     
     return jsonify({'redirect_url': url_for('assessment.unit_test')})
 
@@ -174,26 +205,21 @@ def get_unit_test_data(course_id, unit_title, test_title):
 @login_required
 def unit_test():
     try:
-        # Check if test exists in session
-        if 'current_unit_test' not in session:
+        # Check if a test is in progress
+        attempt = get_attempt(session.get('unit_test_attempt_id'), current_user.id)
+        if attempt is None or attempt.status != 'in_progress':
             flash('No test found. Please try again.', 'error')
             return redirect(url_for('course.course_dashboard'))
             
-        # Load test data
-        test = load_test_from_dict(session['current_unit_test'])
-        
-        # Initialize session variables if they don't exist
-        if 'current_unit_test_index' not in session:
-            session['current_unit_test_index'] = 0
-        if 'current_unit_test_answers' not in session:
-            session['current_unit_test_answers'] = []
-            
-        current_index = session['current_unit_test_index']
+        current_index = attempt.answer_count
         
         # Check if we've completed all questions
-        if current_index >= len(test.questions):
+        if attempt.is_answered:
             return redirect(url_for('assessment.get_unit_results_data'))
         
+        # Load test data
+        test = get_attempt_test(attempt)
+        
         # Handle form submission
         if request.method == 'POST':
             form = AnswerForm()
@@ -224,14 +250,10 @@ def unit_test():
                 else:
                     answer_data['answer'] = answer_data['answer_value']
                 
-                # Save the answer
-                session['current_unit_test_answers'].append(answer_data)
-                session.modified = True
-                
-                # Move to next question or finish test
-                session['current_unit_test_index'] += 1
+                # Save the answer and move to the next question
+                record_answer(attempt, current_index, answer_data)
                 
-                if session['current_unit_test_index'] >= len(test.questions):
+                if current_index + 1 >= attempt.question_count:
                     return redirect(url_for('assessment.get_unit_results_data'))
                     
                 return redirect(url_for('assessment.unit_test'))
@@ -290,15 +312,16 @@ def render_question(test, test_index, lang):
 @login_required
 def get_unit_results_data():
     try:
-        if 'current_unit_test' not in session:
+        attempt = get_attempt(session.get('unit_test_attempt_id'), current_user.id)
+        if attempt is None or attempt.status != 'in_progress':
             flash('No test in progress. Please start a new test.', 'error')
             return redirect(url_for('course.course_dashboard'))
             
         # Load test data
-        test_info = load_test_from_dict(session['current_unit_test'])
-        user_answers = session.get('current_unit_test_answers', [])
-        course_id = session.get('current_course_id')
-        unit_title = session.get('current_unit_title')
+        test_info = get_attempt_test(attempt)
+        user_answers = get_attempt_answers(attempt)
+        course_id = attempt.course_id
+        unit_title = attempt.unit_title
         
         # Ensure we have answers to evaluate
         if not user_answers:
@@ -365,14 +388,12 @@ def get_unit_results_data():
                 
                 if existing_result:
                     existing_result.score = final_score
-                    existing_result.completed_at = datetime.utcnow()
                 else:
                     new_result = UnitTestResult(
                         user_id=current_user.id,
                         course_id=course_id,
                         unit_title=unit_title,
-                        score=final_score,
-                        completed_at=datetime.utcnow()
+                        score=final_score
                     )
                     db.session.add(new_result)
                 db.session.commit()
@@ -385,25 +406,18 @@ def get_unit_results_data():
             'answers': processed_answers,
             'final_score': final_score,
             'test_name': getattr(test_info, 'test_name', 'Unit Test'),
-            'course_id': course_id,
+            'course_id': str(course_id) if course_id else None,
             'unit_title': unit_title,
             'total_questions': total_questions,
             'correct_answers': correct_answers
         }
         
-        # Store in session
-        session['unit_test_final_results'] = results_data
+        # Store server-side; the session keeps a reference
+        put_payload('unit_test_final_results', results_data)
         
         # Clean up session
-        cleanup_keys = [
-            'current_unit_test',
-            'current_unit_test_index',
-            'current_unit_test_answers',
-            'current_course_id',
-            'current_unit_title'
-        ]
-        for key in cleanup_keys:
-            session.pop(key, None)
+        complete_attempt(attempt)
+        session.pop('unit_test_attempt_id', None)
             
         # Redirect to show results page directly (no JSON response needed)
         return redirect(url_for('assessment.show_unit_test_results'))
@@ -418,7 +432,7 @@ def get_unit_results_data():
 @login_required
 def show_unit_test_results():
     # Get results from session
-    results = session.get('unit_test_final_results')
+    results = get_payload('unit_test_final_results')
     
     # If no results in session, show error
     if not results:
@@ -474,7 +488,6 @@ def show_unit_test_results():
     }
     
     # Clear the results from session to prevent showing them again on refresh
-    if 'unit_test_final_results' in session:
-        session.pop('unit_test_final_results')
+    pop_payload('unit_test_final_results')
     
     return render_template('unit_test_results.html', **context)
@@ -2,7 +2,8 @@ from flask import Blueprint, render_template, redirect, url_for, flash, jsonify,
 from flask_login import login_required, current_user
 from app.models import Course, Lesson, CourseShare
 from app.configuration import db
-from sqlalchemy.orm import joinedload
+from app.db_utils import update_json_key
+from app.services import schedule_lesson_prefetch, materialize_course, course_listing, lesson_listing
 import secrets
 from datetime import datetime, timedelta
 from sqlalchemy import and_
@@ -27,7 +28,7 @@ def home():
 @course_bp.route('/course_dashboard')
 @login_required
 def course_dashboard():
-    active_courses = Course.query.filter_by(user_id=current_user.id, status='active').order_by(Course.id.desc()).all()
+    active_courses = course_listing(current_user.id)
     return render_template('course_dashboard.html', courses=active_courses)
 
 
@@ -100,11 +101,10 @@ def show_course(course_id, token=None):
         return redirect(url_for('auth.login', next=request.url))
     user = user or current_user
     # Build a lookup of lessons by title for this course so the template can resolve IDs and completion
-    all_lessons = Lesson.query.filter_by(course_id=course.id).all()
-    lessons_by_title = {l.lesson_title: l for l in all_lessons}
+    lessons_by_title = {l.lesson_title: l for l in lesson_listing(course.id)}
     # Scores per unit may be optional; provide an empty dict by default
     scores = {}
-    return render_template('course.html', course=course, course_obj=course, all_lessons=lessons_by_title, scores=scores, course_id=course.id, is_course_complete=course.completed_lessons >= len([l for u in course.course_data.get('units', []) for l in u.get('lessons', [])]) if course.course_data else False)
+    return render_template('course.html', course=course, course_obj=course, all_lessons=lessons_by_title, scores=scores, course_id=course.id, is_course_complete=course.is_complete)
 
 
 @course_bp.route('/course/<uuid:course_id>/duplicate', methods=['POST'])
@@ -112,26 +112,15 @@ def show_course(course_id, token=None):
 def duplicate_course(course_id):
     original_course = Course.query.get_or_404(course_id)
     try:
-        new_course = Course(
-            user_id=current_user.id,
-            course_title=f"{original_course.course_title} (Copy)",
-            course_data=original_course.course_data,
-            status='active',
-            completed_lessons=0
-        )
-        db.session.add(new_course)
-        db.session.flush()
-        original_lessons = Lesson.query.filter_by(course_id=original_course.id).all()
-        for lesson in original_lessons:
-            new_lesson = Lesson(
-                course_id=new_course.id,
-                unit_title=lesson.unit_title,
-                lesson_title=lesson.lesson_title,
-                html_content=lesson.html_content,
-                is_completed=False
-            )
-            db.session.add(new_lesson)
+        # Generated content is shared, not copied: the copy's lessons point at the same LessonContent rows
+        lesson_content = {(unit_title, lesson_title): content_hash
+                          for unit_title, lesson_title, content_hash in db.session.query(
+                              Lesson.unit_title, Lesson.lesson_title, Lesson.content_hash)
+                          .filter(Lesson.course_id == original_course.id, Lesson.content_hash.isnot(None))}
+        new_course = materialize_course(current_user.id, f"{original_course.course_title} (Copy)",
+                                        original_course.course_data, lesson_content)
         db.session.commit()
+        schedule_lesson_prefetch(new_course, current_user)
         flash('Course has been added to your dashboard!', 'success')
         return jsonify({'success': True, 'redirect_url': url_for('course.show_course', course_id=new_course.id)})
     except Exception as e:
@@ -194,21 +183,19 @@ def public_course(course_id):
         flash('Invalid or expired share link', 'error')
         return redirect(url_for('auth.login'))
     
-    # Get the course with its lessons
-    course = Course.query.options(
-        joinedload(Course.lessons)
-    ).get_or_404(course_id)
+    # Get the course and its lesson outline (the lesson HTML is not shown here)
+    course = Course.query.get_or_404(course_id)
+    lessons = lesson_listing(course.id)
     
     # Group lessons by unit_title
     units = {}
-    for lesson in course.lessons:
+    for lesson in lessons:
         if lesson.unit_title not in units:
             units[lesson.unit_title] = []
         units[lesson.unit_title].append({
             'id': lesson.id,
             'lesson_title': lesson.lesson_title,
-            'is_completed': lesson.is_completed,
-            'html_content': lesson.html_content
+            'is_completed': lesson.is_completed
         })
     
     # Convert to list of units with lessons for the template
@@ -226,7 +213,7 @@ def public_course(course_id):
     if not description or description == 'No description available.':
         try:
             # Get all lessons for the course
-            lesson_titles = [lesson.lesson_title for lesson in course.lessons]
+            lesson_titles = [lesson.lesson_title for lesson in lessons]
             
             # Create prompt for AI
             prompt = f"""Create a concise, engaging course description (2-3 sentences) for a course titled \"{course.course_title}\".
@@ -237,18 +224,16 @@ def public_course(course_id):
             The description should be professional, highlight key learning outcomes, and encourage enrollment.
             """
             
-            # Call AI to generate description
-            from app.ai_clients import _call_gemini
+            # Call AI to generate description; the prompt only depends on the course, so it is cacheable
+            from app.ai_clients import ask_ai
             
             try:
-                ai_description, _ = _call_gemini(prompt)
+                ai_description, _ = ask_ai(prompt, cache=True)
                 if ai_description:
                     description = ai_description.strip()
                     # Store in course_data if it exists
                     if hasattr(course, 'course_data') and isinstance(course.course_data, dict):
-                        if course.course_data is None:
-                            course.course_data = {}
-                        course.course_data['description'] = description
+                        update_json_key(course, 'course_data', 'description', description)
                         db.session.commit()
             except Exception as e:
                 current_app.logger.error(f"Error generating AI description: {str(e)}")
@@ -262,7 +247,7 @@ def public_course(course_id):
         description = 'No description available.'
     
     # Calculate total lessons
-    total_lessons = len(course.lessons)
+    total_lessons = course.total_lessons
     
     # Add description to course data if it doesn't exist
     if not hasattr(course, 'description'):
@@ -315,8 +300,7 @@ def public_certificate(course_id, token=None):
     user = user or current_user
     
     # Check if the course is completed
-    total_lessons = Lesson.query.filter_by(course_id=course.id).count()
-    if not (total_lessons > 0 and course.completed_lessons == total_lessons):
+    if not course.is_complete:
         flash("This course is not yet completed.", "warning")
         if current_user.is_authenticated and current_user.id == course.user_id:
             return redirect(url_for('course.show_course', course_id=course_id))
@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for, Response, stream_with_context, request, flash
 from flask_login import login_required, current_user
 from app.models import Lesson, Course
-from app.services import generate_lesson_content_service
+from app.services import (lesson_event_stream, lesson_text_stream, schedule_lesson_prefetch, mark_lesson_completed,
+                          recent_chat_messages)
 from app.configuration import db
 
 lesson_bp = Blueprint('lesson', __name__)
@@ -13,12 +14,10 @@ def loading_lesson(lesson_id):
     lesson = db.session.get(Lesson, lesson_id)
     if not lesson or lesson.course.user_id != current_user.id:
         return redirect(url_for('course.course_dashboard'))
-    if lesson.html_content:
-        if not lesson.is_completed:
-            lesson.is_completed = True
-            course = lesson.course
-            course.completed_lessons = Lesson.query.filter_by(course_id=course.id, is_completed=True).count()
+    if lesson.content_hash is not None:
+        if not lesson.is_completed and mark_lesson_completed(lesson):
             db.session.commit()
+            schedule_lesson_prefetch(lesson.course, current_user, after_lesson=lesson)
         return redirect(url_for('lesson.show_lesson', lesson_id=lesson.id))
     return render_template('lesson_stream.html', lesson=lesson)
 
@@ -29,8 +28,20 @@ def stream_lesson_data(lesson_id):
     lesson = db.session.get(Lesson, lesson_id)
     if not lesson or lesson.course.user_id != current_user.id:
         return Response("Unauthorized", status=403)
-    lesson_content_generator = generate_lesson_content_service(lesson, current_user)
-    return Response(stream_with_context(lesson_content_generator), mimetype='text/plain')
+    return Response(stream_with_context(lesson_text_stream(lesson)), mimetype='text/plain')
+
+
+@lesson_bp.route('/lesson/<uuid:lesson_id>/events')
+@login_required
+def lesson_events(lesson_id):
+    """Server-sent events stream of the lesson's generation; resumes from the Last-Event-ID header."""
+    lesson = db.session.get(Lesson, lesson_id)
+    if not lesson or lesson.course.user_id != current_user.id:
+        return Response("Unauthorized", status=403)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(stream_with_context(lesson_event_stream(lesson, last_event_id)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @lesson_bp.route('/lesson/<uuid:lesson_id>')
@@ -45,4 +56,5 @@ def show_lesson(lesson_id):
                            title=lesson.lesson_title,
                            content=lesson.html_content,
                            course_id=lesson.course_id,
-                           lesson_id=lesson.id)
\ No newline at end of file
+                           lesson_id=lesson.id,
+                           chat_messages=recent_chat_messages(current_user.id, lesson.id))
\ No newline at end of file
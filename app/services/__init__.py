@@ -7,6 +7,7 @@ from .test_services import (
 from .course_services import (
     generate_knowledge_assessment_service,
     create_course_service,
+    course_listing,
     generate_improved_course_name
 )
 
@@ -14,6 +15,31 @@ from .lesson_services import (
     generate_lesson_content_service
 )
 
-from .tutor_services import get_tutor_response_service
+from .attempt_services import (
+    start_attempt,
+    get_attempt,
+    get_attempt_test,
+    record_answer,
+    get_attempt_answers,
+    complete_attempt
+)
+
+from .progress_services import mark_lesson_completed, adjust_lesson_counts
+
+from .outline_services import materialize_course, sync_course_outline, next_lesson, previous_lesson, lesson_listing
+
+from .content_services import lesson_content_stats
+
+from .context_services import compact_lessons
+
+from .artifact_services import schedule_lesson_artifacts, lesson_artifact, lesson_context_texts
+
+from .usage_services import record_token_usage, flush_token_usage, token_usage_by_feature
+
+from .prefetch_services import schedule_lesson_prefetch
+
+from .stream_services import lesson_event_stream, lesson_text_stream
+
+from .tutor_services import get_tutor_response_service, recent_chat_messages, CHAT_MESSAGE_MAX_CHARS
 
 from .edit_services import edit_course_service
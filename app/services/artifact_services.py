@@ -0,0 +1,119 @@
+"""
+Per-lesson artifacts.
+
+When a lesson gets new content, a background job derives its compact forms (plain text,
+a summary, key concepts and token estimates) and stores them as a LessonArtifact keyed
+by the content hash, so lessons sharing content share the artifact and regenerated
+content gets a fresh one. Prompts that need a lesson's material read the artifact and
+fall back to the HTML while it is still being built; unit test prompts lead long lessons
+with the summary and key concepts when the unit doesn't fit their budget.
+"""
+
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from app.ai_clients import ask_ai
+from app.jobs import enqueue, job_handler
+from app.models import db, Lesson, LessonArtifact, LessonContent
+from app.signals import lesson_content_changed
+from models.json_extractor import JsonExtractor
+from models.prompt_builders import LessonPromptBuilder
+from .context_services import UNIT_TEST_CONTEXT_TOKENS, estimate_tokens, lesson_text_blocks
+from .usage_services import record_token_usage
+
+ARTIFACT_JOB = 'lesson_artifacts'
+# Longest lesson text sent for summarization, in characters
+SUMMARY_INPUT_CHARS = 48000
+
+
+def schedule_lesson_artifacts(content_hash, user_id=None):
+    """Queue artifact generation for a content unless it already has them. Returns the Job or None."""
+    if content_hash is None or db.session.get(LessonArtifact, content_hash) is not None:
+        return None
+    return enqueue(ARTIFACT_JOB, {'content_hash': content_hash}, user_id=user_id)
+
+
+@lesson_content_changed.connect
+def _on_lesson_content_changed(lesson, previous_hash=None, content_hash=None, **extra):
+    # The previous content's artifact stays with it (other lessons may share it) and is
+    # deleted along with the content once nothing refers to it
+    user_id = current_user.id if current_user and current_user.is_authenticated else None
+    try:
+        schedule_lesson_artifacts(content_hash, user_id=user_id)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error scheduling lesson artifacts: {e}")
+
+
+@job_handler(ARTIFACT_JOB)
+def build_lesson_artifacts(payload):
+    """Background job: derive and store the artifacts of one lesson content."""
+    digest = payload['content_hash']
+    content = db.session.get(LessonContent, digest)
+    if content is None or db.session.get(LessonArtifact, digest) is not None:
+        return {'skipped': True, 'tokens': 0}
+
+    html = content.html
+    plain_text = '\n'.join(lesson_text_blocks(html))
+    lesson = Lesson.query.filter_by(content_hash=digest).first()
+    prompt = LessonPromptBuilder.build_lesson_summary_prompt(lesson.lesson_title if lesson else '',
+                                                            plain_text[:SUMMARY_INPUT_CHARS])
+    raw_output, tokens = ask_ai(prompt, json_mode=True, cache=True)
+    record_token_usage('lesson_artifacts', tokens)
+
+    data = JsonExtractor.extract_json(raw_output) if raw_output and "Error:" not in raw_output else None
+    data = data if isinstance(data, dict) else {}
+    summary = str(data.get('summary') or '').strip() or None
+    key_concepts = [str(concept).strip() for concept in data.get('key_concepts') or [] if str(concept).strip()]
+
+    db.session.add(LessonArtifact(
+        content_hash=digest, plain_text=plain_text, summary=summary, key_concepts=key_concepts,
+        html_tokens=estimate_tokens(html), text_tokens=estimate_tokens(plain_text),
+        summary_tokens=estimate_tokens(summary or ''),
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Built concurrently by another worker for a lesson with the same content
+        db.session.rollback()
+        return {'skipped': True, 'tokens': tokens}
+    return {'tokens': tokens, 'summarized': summary is not None}
+
+
+def lesson_artifact(lesson):
+    """The lesson's artifact, or None if its content has none yet."""
+    return db.session.get(LessonArtifact, lesson.content_hash) if lesson.content_hash else None
+
+
+def lesson_context_texts(lessons, max_tokens=UNIT_TEST_CONTEXT_TOKENS):
+    """
+    (lesson_title, material) for each lesson with content, for compact_lessons(): the stored text
+    blocks where the artifact exists, the HTML otherwise. Two queries, whatever the number of lessons.
+
+    When the lessons don't fit max_tokens together, a lesson longer than an even share of it leads
+    with its summary and key concepts, so the part compaction keeps still covers the whole lesson.
+    """
+    hashes = {lesson.content_hash for lesson in lessons if lesson.content_hash}
+    artifacts = {artifact.content_hash: artifact for artifact in
+                 LessonArtifact.query.filter(LessonArtifact.content_hash.in_(hashes))} if hashes else {}
+    missing = hashes - artifacts.keys()
+    html = {content.hash: content.html for content in
+            LessonContent.query.filter(LessonContent.hash.in_(missing))} if missing else {}
+
+    lessons = [lesson for lesson in lessons if lesson.content_hash]
+    sizes = {digest: artifact.text_tokens for digest, artifact in artifacts.items()}
+    sizes.update((digest, estimate_tokens('\n'.join(lesson_text_blocks(text)))) for digest, text in html.items())
+    share = max_tokens // len(lessons) if lessons else 0
+    tight = sum(sizes[lesson.content_hash] for lesson in lessons) > max_tokens
+
+    def material(digest):
+        if digest not in artifacts:
+            return html[digest]
+        artifact = artifacts[digest]
+        if tight and artifact.summary and artifact.text_tokens > share:
+            overview = [f"Summary: {artifact.summary}"]
+            if artifact.key_concepts:
+                overview.append(f"Key concepts: {'; '.join(artifact.key_concepts)}")
+            return tuple(overview) + artifact.text_blocks
+        return artifact.text_blocks
+
+    return [(lesson.lesson_title, material(lesson.content_hash)) for lesson in lessons]
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+from sqlalchemy import update
+from app.helpers import save_test_to_dict, load_test_from_dict
+from app.jobs import maintenance_task
+from app.models import db, TestAttempt, TestAnswer
+
+# In-progress attempts untouched for this long are considered abandoned
+ATTEMPT_RETENTION = timedelta(days=7)
+
+
+def start_attempt(user, test, kind, course_id=None, unit_title=None):
+    """Persist a freshly generated test as a new attempt for the user."""
+    attempt = TestAttempt(user_id=user.id, kind=kind, course_id=course_id, unit_title=unit_title,
+                          test_data=save_test_to_dict(test), question_count=len(test.questions))
+    db.session.add(attempt)
+    db.session.commit()
+    return attempt
+
+
+def get_attempt(attempt_id, user_id):
+    """Return the user's attempt, or None. Does not load the test itself."""
+    if not attempt_id:
+        return None
+    return TestAttempt.query.filter_by(id=attempt_id, user_id=user_id).first()
+
+
+@lru_cache(maxsize=512)
+def _cached_test(attempt_id):
+    test_data = db.session.query(TestAttempt.test_data).filter_by(id=attempt_id).scalar()
+    return load_test_from_dict(test_data)
+
+
+def get_attempt_test(attempt):
+    """The attempt's Test object. Tests never change once generated, so they are decoded once per process."""
+    return _cached_test(attempt.id)
+
+
+def record_answer(attempt, position, answer_data):
+    """
+    Store the answer to question number `position` and advance the attempt.
+    Returns False if that question was already answered (e.g. a double submit), leaving the attempt as is.
+    """
+    advanced = db.session.execute(
+        update(TestAttempt)
+        .where(TestAttempt.id == attempt.id, TestAttempt.answer_count == position)
+        .values(answer_count=position + 1)
+    ).rowcount
+    if not advanced:
+        db.session.rollback()
+        return False
+    db.session.add(TestAnswer(attempt_id=attempt.id, position=position,
+                              question=answer_data.get('question', ''),
+                              answer=answer_data.get('answer', ''),
+                              answer_value=answer_data.get('answer_value', ''),
+                              correct_answer=answer_data.get('correct_answer')))
+    db.session.commit()
+    return True
+
+
+def get_attempt_answers(attempt):
+    """The attempt's answers as dicts, in question order."""
+    answers = TestAnswer.query.filter_by(attempt_id=attempt.id).order_by(TestAnswer.position).all()
+    return [answer.to_dict() for answer in answers]
+
+
+def complete_attempt(attempt):
+    attempt.status = 'completed'
+    attempt.completed_at = datetime.utcnow()
+    db.session.commit()
+
+
+@maintenance_task
+def purge_abandoned_attempts():
+    cutoff = datetime.utcnow() - ATTEMPT_RETENTION
+    deleted = TestAttempt.query.filter(TestAttempt.status == 'in_progress', TestAttempt.created_at < cutoff).delete(
+        synchronize_session=False)
+    db.session.commit()
+    return deleted
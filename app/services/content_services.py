@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app.jobs import maintenance_task
+from app.models import db, Lesson, LessonContent
+
+# Unreferenced content stored (or reused) more recently than this is kept, so a write that is
+# about to reference it can't lose it
+ORPHAN_GRACE = timedelta(hours=1)
+
+
+def lesson_content_stats():
+    """How much lesson HTML is shared between lessons (e.g. by duplicated courses), and how well it compresses."""
+    lessons, referenced_size = db.session.query(
+        func.count(Lesson.id), func.coalesce(func.sum(LessonContent.size), 0)
+    ).join(LessonContent, Lesson.content_hash == LessonContent.hash).one()
+    blobs, distinct_size, stored_bytes = db.session.query(
+        func.count(LessonContent.hash), func.coalesce(func.sum(LessonContent.size), 0),
+        func.coalesce(func.sum(func.length(LessonContent.html)), 0)).one()
+    return {
+        'lessons_with_content': lessons,
+        'distinct_contents': blobs,
+        'referenced_chars': referenced_size,
+        'distinct_chars': distinct_size,
+        'stored_bytes': stored_bytes,
+        'dedup_ratio': round(referenced_size / distinct_size, 2) if distinct_size else None,
+        'compression_ratio': round(distinct_size / stored_bytes, 2) if stored_bytes else None,
+    }
+
+
+@maintenance_task
+def purge_orphan_lesson_content():
+    """Delete content no lesson refers to any more, e.g. after a lesson was regenerated or a course deleted."""
+    cutoff = datetime.utcnow() - ORPHAN_GRACE
+    referenced = db.session.query(Lesson.content_hash).filter(Lesson.content_hash.isnot(None))
+    deleted = LessonContent.query.filter(LessonContent.created_at < cutoff,
+                                         LessonContent.hash.notin_(referenced)).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
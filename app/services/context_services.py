@@ -0,0 +1,149 @@
+"""
+Compaction of lesson content used as prompt context.
+
+Unit tests are generated from the lessons of the unit. Their stored HTML is mostly markup,
+the appended "Next up" navigation and per-lesson boilerplate (course and unit banners,
+completion times) repeated in every lesson. compact_lessons() turns it into plain text blocks,
+drops navigation and blocks already seen, and packs what is left into a token budget, giving
+every lesson a fair share and cutting long blocks at a sentence (or else word) boundary.
+"""
+
+import os
+import re
+import time
+from functools import lru_cache
+from typing import List, NamedTuple, Sequence, Tuple, Union
+from bs4 import BeautifulSoup
+
+# Token budget for the lesson context of a unit test prompt (estimated at 4 characters per token)
+UNIT_TEST_CONTEXT_TOKENS = int(os.getenv('UNIT_TEST_CONTEXT_TOKENS', 6000))
+CHARS_PER_TOKEN = 4
+
+# The link app.services.lesson_services appends to every lesson, in either language
+_NAVIGATION_PREFIXES = ('👉', 'Next up', 'Далее')
+_BLOCK_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'pre', 'blockquote', 'tr']
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+# Shortest piece worth keeping when a block has to be cut between words
+_MIN_CUT_CHARS = 40
+
+
+class CompactContext(NamedTuple):
+    text: str
+    original_tokens: int
+    tokens: int
+    elapsed_ms: float
+
+    @property
+    def ratio(self) -> float:
+        return round(self.original_tokens / self.tokens, 2) if self.tokens else 0.0
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+@lru_cache(maxsize=256)
+def lesson_text_blocks(html: str) -> Tuple[str, ...]:
+    """
+    The readable text of lesson HTML as blocks (headings, paragraphs, list items), navigation removed.
+    Parsing dominates compaction time, and lesson HTML rarely changes, so results are memoized.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'hr']):
+        tag.decompose()
+    for heading in soup.find_all(['h2', 'h3', 'h4']):
+        if heading.get_text(strip=True).startswith(_NAVIGATION_PREFIXES):
+            heading.decompose()
+
+    blocks = []
+    for element in soup.find_all(_BLOCK_TAGS):
+        # A nested block (a <p> inside an <li>) is part of the text of the outermost one
+        if element.find_parent(_BLOCK_TAGS):
+            continue
+        text = ' '.join(element.get_text(' ', strip=True).split())
+        if text:
+            if element.name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+                text = f"## {text}"
+            elif element.name == 'li':
+                text = f"- {text}"
+            blocks.append(text)
+    if not blocks:
+        text = ' '.join(soup.get_text(' ', strip=True).split())
+        blocks = [text] if text else []
+    return tuple(blocks)
+
+
+def _cut(block: str, room: int) -> str:
+    """The leading whole sentences of block that fit in room characters, else its leading words."""
+    partial = ''
+    for sentence in _SENTENCE_END.split(block):
+        if len(partial) + len(sentence) + 1 > room:
+            break
+        partial = f"{partial} {sentence}".strip()
+    if partial or room < _MIN_CUT_CHARS:
+        return partial
+    # No sentence boundary in reach (code, long unpunctuated text): cut between words
+    cut = block[:room - 1]
+    return (cut.rsplit(' ', 1)[0] if ' ' in cut else cut).rstrip() + '…'
+
+
+def _truncate(blocks: Sequence[str], budget_chars: int) -> List[str]:
+    """
+    The blocks that fit in budget_chars, in order. A block that doesn't fit is cut to the room left,
+    and later blocks are still tried, so one long block doesn't crowd out the rest of the lesson.
+    """
+    kept, used = [], 0
+    for block in blocks:
+        room = budget_chars - used - 1
+        if room < len(block):
+            block = _cut(block, room)
+        if block:
+            kept.append(block)
+            used += len(block) + 1
+    return kept
+
+
+def compact_lessons(lessons: Sequence[Tuple[str, Union[str, Sequence[str]]]],
+                    max_tokens: int = UNIT_TEST_CONTEXT_TOKENS) -> CompactContext:
+    """
+    Compact (lesson_title, material) pairs into one plain-text context of at most max_tokens, where
+    material is the lesson HTML or its already extracted text blocks (a LessonArtifact's text_blocks).
+    Lessons keep their order; each is introduced by its title.
+    """
+    started = time.perf_counter()
+    original_chars = sum(len(material) if isinstance(material, str) else sum(len(block) + 1 for block in material)
+                         for _, material in lessons if material)
+
+    seen = set()
+    sections = []
+    for title, material in lessons:
+        if not material:
+            continue
+        blocks = []
+        for block in lesson_text_blocks(material) if isinstance(material, str) else material:
+            key = block.casefold()
+            if key not in seen:
+                seen.add(key)
+                blocks.append(block)
+        if blocks:
+            sections.append((f"# {title}", blocks))
+
+    # Share the budget evenly; what short lessons don't use goes to the longer ones
+    budget = max_tokens * CHARS_PER_TOKEN - sum(len(header) + 2 for header, _ in sections)
+    sizes = [sum(len(block) + 1 for block in blocks) for _, blocks in sections]
+    shares = [0] * len(sections)
+    remaining = sorted(range(len(sections)), key=lambda i: sizes[i])
+    while remaining and budget > 0:
+        share = budget // len(remaining)
+        index = remaining.pop(0)
+        shares[index] = min(sizes[index], share)
+        budget -= shares[index]
+
+    parts = []
+    for (header, blocks), share in zip(sections, shares):
+        kept = _truncate(blocks, share)
+        if kept:
+            parts.append(header + '\n' + '\n'.join(kept))
+    text = '\n\n'.join(parts)
+    return CompactContext(text, original_chars // CHARS_PER_TOKEN, estimate_tokens(text),
+                          round((time.perf_counter() - started) * 1000, 1))
@@ -1,9 +1,16 @@
+from flask_login import current_user
 from app.ai_clients import ask_ai, ask_gemini
-from app.models import db, Course, Lesson
+from app.jobs import job_handler
+from app.models import db, Course
+from sqlalchemy.orm import load_only
 from models.json_extractor import JsonExtractor
 from models.prompt_builders import CoursePromptBuilder
-from .utils import update_token_count
-from .test_services import calculate_percentage_score_service
+from .attempt_services import get_attempt, get_attempt_test, get_attempt_answers, complete_attempt
+from .outline_services import materialize_course
+from .pipeline import Pipeline
+from .prefetch_services import schedule_lesson_prefetch
+from .usage_services import record_token_usage
+from .test_services import calculate_percentage_score_service, evaluate_answers_service
 
 def generate_knowledge_assessment_service(detailed_results):
     prompt = ("Provide a concise, one or two paragraph assessment of the user's knowledge "
@@ -13,16 +20,19 @@ def generate_knowledge_assessment_service(detailed_results):
         prompt += f"Q: {result['question']}\nA: {result['answer']}\nAssessment: {result['assessment']}\n\n"
 
     assessment_text, tokens = ask_ai(prompt, model="gpt-4o-mini", json_mode=False)
-    update_token_count(tokens)
+    record_token_usage('knowledge_assessment', tokens)
     return assessment_text if assessment_text and "Error:" not in assessment_text else "Could not generate assessment."
 
 
-def create_course_service(user, topic, knowledge_assessment, assessed_answers):
+def generate_course_structure_service(user, topic, assessed_answers, knowledge_assessment=None):
+    """Ask the model for a course outline. Returns the parsed course_data dict or None."""
     prompt = CoursePromptBuilder.build_course_structure_prompt(
-        topic, knowledge_assessment, assessed_answers, user.language, user
+        topic, knowledge_assessment, assessed_answers, user.language,
+        lesson_duration=user.preferred_lesson_length,
+        user_profile={'age': user.age, 'bio': user.bio}
     )
     raw_output, tokens = ask_ai(prompt, json_mode=True)
-    update_token_count(tokens)
+    record_token_usage('course_outline', tokens)
 
     if not raw_output or "Error:" in raw_output:
         print(f"Failed to generate course structure. AI response: {raw_output}")
@@ -32,33 +42,113 @@ def create_course_service(user, topic, knowledge_assessment, assessed_answers):
     if not course_data:
         print("Failed to parse course structure from AI response.")
         return None
+    return course_data
 
-    from .course_services import generate_improved_course_name
-    original_name = course_data.get("course_title", topic)
-    improved_name = generate_improved_course_name(original_name)
-    course_data['course_title'] = improved_name
 
-    course = Course(user_id=user.id, course_title=improved_name, course_data=course_data)
-    db.session.add(course)
-    db.session.commit()
-
-    for unit in course_data.get('units', []):
-        for lesson_data in unit.get('lessons', []):
-            new_lesson = Lesson(course_id=course.id,
-                                unit_title=unit.get('unit_title'),
-                                lesson_title=lesson_data.get('lesson_title'))
-            db.session.add(new_lesson)
+def save_course(user, course_data, course_title):
+    course_data['course_title'] = course_title
+    course = materialize_course(user.id, course_title, course_data)
     db.session.commit()
+    schedule_lesson_prefetch(course, user)
     return course
 
 
+def course_listing(user_id, status='active'):
+    """A user's courses, newest first, with only the columns the dashboard shows (no course_data)."""
+    return (Course.query.options(load_only(Course.id, Course.user_id, Course.course_title, Course.status,
+                                           Course.completed_lessons, Course.total_lessons))
+            .filter_by(user_id=user_id, status=status).order_by(Course.id.desc()).all())
+
+
+def create_course_service(user, topic, knowledge_assessment, assessed_answers):
+    course_data = generate_course_structure_service(user, topic, assessed_answers, knowledge_assessment)
+    if not course_data:
+        return None
+
+    original_name = course_data.get("course_title", topic)
+    improved_name = generate_improved_course_name(original_name)
+    return save_course(user, course_data, improved_name)
+
+
 def generate_improved_course_name(original_name):
     prompt = (f"Improve this course name to be more concise and informative. Keep it under 60 characters. "
               f"Original name: {original_name}. Return ONLY the improved name, no quotes or additional text.")
-    improved_name, tokens = ask_gemini(prompt)
+    improved_name, tokens = ask_gemini(prompt, cache=True)
     if not improved_name or "Error:" in improved_name:
         improved_name, tokens = ask_ai(prompt)
-    update_token_count(tokens)
+    record_token_usage('course_name', tokens)
 
     improved_name = improved_name.strip('"\'').strip()
     return improved_name if improved_name else original_name
+
+
+def _assessment_failed(knowledge_assessment):
+    return "Error:" in knowledge_assessment or "Unauthorized" in knowledge_assessment
+
+
+@job_handler('course_from_assessment')
+def generate_course_from_assessment(payload):
+    """
+    Background job: grade the initial assessment and build the personalized course.
+    Runs as the job's user. The result's 'outcome' tells the polling request what to show.
+
+    After grading, the knowledge assessment, the score and the course outline only depend on the
+    graded answers, and the title only on the outline, so they run as a pipeline:
+
+        evaluate -> assessment ----------------> course
+                 -> structure -> title --------^
+                 -> score
+    """
+    user = current_user._get_current_object()
+    attempt = get_attempt(payload['attempt_id'], user.id)
+    if attempt is None:
+        return {'outcome': 'evaluation_failed', 'timings': {}}
+    test = get_attempt_test(attempt)
+    topic = test.topic
+
+    def score(evaluate):
+        # The score is only shown alongside the course; a failure must not cost the learner the course
+        try:
+            return calculate_percentage_score_service(evaluate) if evaluate else None
+        except Exception as e:
+            print(f"Error scoring assessment: {e}")
+            return None
+
+    def save(assessment, structure, title):
+        if _assessment_failed(assessment) or not structure:
+            return None
+        return save_course(user, structure, title).id
+
+    pipeline = (
+        Pipeline('course_from_assessment')
+        .step('evaluate', lambda questions, answers: evaluate_answers_service(questions, answers, user.language),
+              deps=['questions', 'answers'])
+        .step('assessment', lambda evaluate: generate_knowledge_assessment_service(evaluate) if evaluate else None,
+              deps=['evaluate'])
+        .step('score', score, deps=['evaluate'])
+        .step('structure', lambda evaluate: generate_course_structure_service(user, topic, evaluate) if evaluate else None,
+              deps=['evaluate'])
+        .step('title', lambda structure: generate_improved_course_name(structure.get('course_title', topic))
+              if structure else None, deps=['structure'])
+        .step('course', save, deps=['assessment', 'structure', 'title'])
+    )
+    results = pipeline.run(questions=test.questions, answers=get_attempt_answers(attempt))
+    timings = {k: round(v, 3) for k, v in pipeline.timings.items()}
+
+    detailed_results = results['evaluate']
+    if not detailed_results:
+        return {'outcome': 'evaluation_failed', 'timings': timings}
+    complete_attempt(attempt)
+    if _assessment_failed(results['assessment']):
+        return {'outcome': 'assessment_failed', 'detailed_results': detailed_results, 'timings': timings}
+    if not results['course']:
+        return {'outcome': 'course_failed', 'timings': timings}
+
+    return {
+        'outcome': 'created',
+        'course_id': str(results['course']),
+        'detailed_results': detailed_results,
+        'knowledge_assessment': results['assessment'],
+        'score': results['score'],
+        'timings': timings,
+    }
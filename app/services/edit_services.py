@@ -1,8 +1,11 @@
 from app.models import db, Lesson
+from app.db_utils import update_json_key
 from app.ai_clients import ask_ai
 from models.json_extractor import JsonExtractor
 from models.prompt_builders import CourseEditorPromptBuilder
-from .utils import update_token_count
+from .outline_services import sync_course_outline
+from .progress_services import adjust_lesson_counts
+from .usage_services import record_token_usage
 
 def edit_course_service(course, user_request, language):
     print(f"[DEBUG] edit_course_service called with request: {user_request}")
@@ -18,15 +21,13 @@ def edit_course_service(course, user_request, language):
         
         try:
             new_title, tokens = ask_ai(prompt, model="gemini-2.5-flash", json_mode=False)
-            update_token_count(tokens)
+            record_token_usage('course_title_edit', tokens)
 
             if new_title and "Error:" not in new_title:
                 new_title = new_title.strip('\'" ')
-                course_data = course.course_data
-                course_data["course_title"] = new_title
-                course.course_data = course_data
+                update_json_key(course, 'course_data', 'course_title', new_title)
                 db.session.commit()
-                return course_data, None
+                return course.course_data, None
             else:
                 err = f"Failed to generate an improved title. Response: {new_title}"
                 print(f"[ERROR] {err}")
@@ -41,7 +42,7 @@ def edit_course_service(course, user_request, language):
     
     try:
         new_course_str, tokens = ask_ai(prompt, model="gemini-2.5-flash", json_mode=True)
-        update_token_count(tokens)
+        record_token_usage('course_edit', tokens)
 
         if not new_course_str or "Error:" in new_course_str:
             err = f"AI failed to generate a new course structure. Response: {new_course_str}"
@@ -62,8 +63,11 @@ def edit_course_service(course, user_request, language):
             new_titles = {l['lesson_title'] for u in new_course_json['units'] for l in u.get('lessons', []) if 'lesson_title' in l}
 
             existing_lessons = {l.lesson_title: l for l in Lesson.query.filter_by(course_id=course.id).all()}
+            removed = removed_completed = added = 0
             for title, obj in existing_lessons.items():
                 if title not in new_titles:
+                    removed += 1
+                    removed_completed += obj.is_completed
                     db.session.delete(obj)
 
             for u in new_course_json['units']:
@@ -71,8 +75,10 @@ def edit_course_service(course, user_request, language):
                     t = l.get('lesson_title')
                     if t and t not in existing_lessons:
                         db.session.add(Lesson(course_id=course.id, unit_title=u['unit_title'], lesson_title=t))
+                        added += 1
 
-            course.completed_lessons = Lesson.query.filter_by(course_id=course.id, is_completed=True).count()
+            adjust_lesson_counts(course.id, total=added - removed, completed=-removed_completed)
+            sync_course_outline(course)
             db.session.commit()
             print("[DEBUG] Course update completed successfully")
             return new_course_json, None
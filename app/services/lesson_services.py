@@ -2,18 +2,36 @@ import re
 import markdown
 from flask import url_for
 from app.ai_clients import ask_ai_stream
-from app.models import db, Lesson
+from app.models import db, Lesson, Unit
+from app.signals import lesson_content_changed
+from .outline_services import next_lesson
+from .progress_services import mark_lesson_completed
+from .usage_services import record_token_usage
 from models.prompt_builders import LessonPromptBuilder
 
-def generate_lesson_content_service(lesson, user):
+def build_lesson_prompt(lesson, user):
     user_profile = {'age': user.age, 'bio': user.bio}
     course_structure = lesson.course.course_data
 
-    prompt = LessonPromptBuilder.build_lesson_content_prompt(
+    return LessonPromptBuilder.build_lesson_content_prompt(
         lesson.lesson_title, lesson.unit_title, user.language, user.preferred_lesson_length,
         user_profile=user_profile, course_structure=course_structure
     )
 
+
+def render_lesson_html(lesson, user, markdown_text):
+    """Turn generated lesson markdown into the stored HTML, with the 'Next up' link appended."""
+    if "Error:" in markdown_text:
+        return "<p>Error generating lesson content. Please try again later.</p>"
+    next_up_link_md = _generate_next_up_link(lesson, user)
+    final_md = markdown_text + next_up_link_md
+    processed_text = re.sub(r'\[IMAGE_PROMPT:\s*"(.*?)"\]', r'<i>[Image Prompt: "\1"]</i>', final_md)
+    return markdown.markdown(processed_text, extensions=["fenced_code", "tables"])
+
+
+def generate_lesson_content_service(lesson, user):
+    prompt = build_lesson_prompt(lesson, user)
+
     def content_generator():
         response_stream = ask_ai_stream(prompt, model="gpt-4o")
         full_markdown_chunks = []
@@ -21,55 +39,35 @@ def generate_lesson_content_service(lesson, user):
         for chunk in response_stream:
             yield chunk
             full_markdown_chunks.append(chunk)
+        record_token_usage('lesson', response_stream.call.total_tokens)
 
-        full_markdown_text = "".join(full_markdown_chunks)
-        if "Error:" in full_markdown_text:
-            lesson.html_content = "<p>Error generating lesson content. Please try again later.</p>"
-        else:
-            next_up_link_md = _generate_next_up_link(lesson, user)
-            final_md = full_markdown_text + next_up_link_md
-            processed_text = re.sub(r'\[IMAGE_PROMPT:\s*"(.*?)"\]', r'<i>[Image Prompt: "\1"]</i>', final_md)
-            lesson.html_content = markdown.markdown(processed_text, extensions=["fenced_code", "tables"])
-
-        if not lesson.is_completed:
-            lesson.is_completed = True
-            course = lesson.course
-            course.completed_lessons = Lesson.query.filter_by(course_id=course.id, is_completed=True).count()
+        previous_hash = lesson.content_hash
+        lesson.html_content = render_lesson_html(lesson, user, "".join(full_markdown_chunks))
 
+        newly_completed = not lesson.is_completed and mark_lesson_completed(lesson)
         db.session.commit()
 
+        if newly_completed:
+            from .prefetch_services import schedule_lesson_prefetch
+            schedule_lesson_prefetch(lesson.course, user, after_lesson=lesson)
+        lesson_content_changed.send(lesson, previous_hash=previous_hash, content_hash=lesson.content_hash)
+
     return content_generator()
 
 
 def _generate_next_up_link(lesson, user):
-    course = lesson.course
     lang = user.language
     try:
-        units = course.course_data.get('units', [])
-        current_unit_index, current_unit = next(
-            ((i, u) for i, u in enumerate(units) if u['unit_title'] == lesson.unit_title), (None, None))
-        if not current_unit:
-            return ""
-
-        lessons = current_unit.get('lessons', [])
-        current_index = next(
-            (i for i, l in enumerate(lessons) if l['lesson_title'] == lesson.lesson_title), None)
-        if current_index is None:
-            return ""
-
-        if current_index + 1 < len(lessons):
-            next_lesson = lessons[current_index + 1]
-            next_lesson_obj = Lesson.query.filter_by(course_id=course.id,
-                                                     lesson_title=next_lesson.get('lesson_title')).first()
-            if next_lesson_obj:
-                url = url_for('loading_lesson', lesson_id=next_lesson_obj.id, _external=True)
-                return f"\n\n<hr>\n\n### 👉 {'Далее' if lang == 'russian' else 'Next up'}: [{next_lesson['lesson_title']}]({url})"
+        next_lesson_obj = next_lesson(lesson)
+        if next_lesson_obj and next_lesson_obj.unit_id == lesson.unit_id:
+            url = url_for('lesson.loading_lesson', lesson_id=next_lesson_obj.id)
+            return f"\n\n<hr>\n\n### 👉 {'Далее' if lang == 'russian' else 'Next up'}: [{next_lesson_obj.lesson_title}]({url})"
 
-        test_data = current_unit.get('test')
-        if test_data and test_data.get('test_title'):
-            url = url_for('loading_unit_test', course_id=course.id,
-                          unit_title=current_unit['unit_title'], test_title=test_data['test_title'], _external=True)
-            return f"\n\n<hr>\n\n### 👉 {'Далее' if lang == 'russian' else 'Next up'}: [{test_data['test_title']}]({url})"
+        unit = db.session.get(Unit, lesson.unit_id) if lesson.unit_id else None
+        if unit and unit.test_title:
+            url = url_for('assessment.loading_unit_test', course_id=lesson.course_id,
+                          unit_title=unit.unit_title, test_title=unit.test_title)
+            return f"\n\n<hr>\n\n### 👉 {'Далее' if lang == 'russian' else 'Next up'}: [{unit.test_title}]({url})"
     except Exception as e:
         print(f"Error generating 'Next up' link: {e}")
     return ''
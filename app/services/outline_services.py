@@ -0,0 +1,138 @@
+"""
+Course outline tables.
+
+Course.course_data holds the outline the model generated and is what prompts are built
+from, but ordering lives in the units table and Lesson.position: a lesson's neighbours
+are one indexed query on (course_id, position) instead of a walk over the JSON matching
+titles. materialize_course() creates a course with its rows, and sync_course_outline()
+re-derives them whenever course_data changes.
+"""
+
+import uuid
+from collections import defaultdict
+from sqlalchemy import insert
+from sqlalchemy.orm import load_only
+from app.models import db, Course, Lesson, Unit
+
+
+def materialize_course(user_id, course_title, course_data, lesson_content=None):
+    """
+    Insert a course with its units and lessons. Ids are generated here, so each table is a single
+    multi-row INSERT rather than a flush per object. lesson_content optionally maps
+    (unit_title, lesson_title) to the LessonContent hash to give that lesson. Does not commit;
+    returns the new Course.
+    """
+    course_id = uuid.uuid4()
+    units, lessons = [], []
+    for index, unit_data in enumerate(course_data.get('units', [])):
+        unit_id = uuid.uuid4()
+        unit_title = unit_data.get('unit_title') or ''
+        units.append({'id': unit_id, 'course_id': course_id, 'position': index, 'unit_title': unit_title,
+                      'test_title': (unit_data.get('test') or {}).get('test_title')})
+        for lesson_data in unit_data.get('lessons', []):
+            title = lesson_data.get('lesson_title')
+            if not title:
+                continue
+            lessons.append({'id': uuid.uuid4(), 'course_id': course_id, 'unit_id': unit_id,
+                            'position': len(lessons), 'unit_title': unit_title, 'lesson_title': title,
+                            'content_hash': (lesson_content or {}).get((unit_title, title)), 'is_completed': False})
+
+    db.session.execute(insert(Course).values(id=course_id, user_id=user_id, course_title=course_title,
+                                             course_data=course_data, status='active',
+                                             completed_lessons=0, total_lessons=len(lessons)))
+    if units:
+        db.session.execute(insert(Unit), units)
+    if lessons:
+        db.session.execute(insert(Lesson), lessons)
+    return db.session.get(Course, course_id)
+
+
+def sync_course_outline(course):
+    """
+    Bring the course's units and lesson positions in line with course_data. Lessons are matched to
+    outline entries by unit and lesson title, or by lesson title alone for old lessons saved without
+    a unit title; lessons missing from the outline are left without a position. Lessons must already
+    exist. Does not commit.
+    """
+    outline = (course.course_data or {}).get('units', [])
+    units = Unit.query.filter_by(course_id=course.id).order_by(Unit.position).all()
+    lessons = Lesson.query.filter_by(course_id=course.id).all()
+    by_key, by_title = defaultdict(list), defaultdict(list)
+    for lesson in lessons:
+        by_key[(lesson.unit_title, lesson.lesson_title)].append(lesson)
+        by_title[lesson.lesson_title].append(lesson)
+    placed = set()
+
+    def take(candidates):
+        for candidate in candidates:
+            if candidate.id not in placed:
+                placed.add(candidate.id)
+                return candidate
+        return None
+
+    position = 0
+    for index, unit_data in enumerate(outline):
+        if index < len(units):
+            unit = units[index]
+        else:
+            unit = Unit(id=uuid.uuid4(), course_id=course.id, position=index)
+            db.session.add(unit)
+            units.append(unit)
+        unit.unit_title = unit_data.get('unit_title') or ''
+        unit.test_title = (unit_data.get('test') or {}).get('test_title')
+        for lesson_data in unit_data.get('lessons', []):
+            title = lesson_data.get('lesson_title')
+            lesson = take(by_key.get((unit.unit_title, title), ())) or take(by_title.get(title, ()))
+            if lesson is None:
+                continue
+            lesson.unit_id = unit.id
+            lesson.unit_title = unit.unit_title
+            lesson.position = position
+            position += 1
+
+    for lesson in lessons:
+        if lesson.id not in placed:
+            lesson.unit_id = None
+            lesson.position = None
+    for unit in units[len(outline):]:
+        db.session.delete(unit)
+
+
+def next_lesson(lesson):
+    """The lesson after this one in the course, or None."""
+    if lesson.position is None:
+        return None
+    return (Lesson.query.filter(Lesson.course_id == lesson.course_id, Lesson.position > lesson.position)
+            .order_by(Lesson.position).first())
+
+
+def previous_lesson(lesson):
+    """The lesson before this one in the course, or None."""
+    if lesson.position is None:
+        return None
+    return (Lesson.query.filter(Lesson.course_id == lesson.course_id, Lesson.position < lesson.position)
+            .order_by(Lesson.position.desc()).first())
+
+
+def upcoming_lessons(course_id, after_position=None, without_content=False, limit=None):
+    """Lessons of a course in learning order, optionally only those after a position or not generated yet."""
+    query = Lesson.query.filter(Lesson.course_id == course_id, Lesson.position.isnot(None))
+    if after_position is not None:
+        query = query.filter(Lesson.position > after_position)
+    if without_content:
+        query = query.filter(Lesson.content_hash.is_(None))
+    query = query.order_by(Lesson.position)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def lesson_listing(course_id):
+    """
+    The lessons of a course in learning order with only the columns a course page or outline listing
+    shows. The lesson HTML and anything else is left unloaded.
+    """
+    return (Lesson.query.options(load_only(Lesson.id, Lesson.course_id, Lesson.unit_id, Lesson.position,
+                                           Lesson.unit_title, Lesson.lesson_title, Lesson.is_completed))
+            .filter(Lesson.course_id == course_id)
+            .order_by(Lesson.position.is_(None), Lesson.position).all())
@@ -0,0 +1,88 @@
+import os
+from datetime import datetime, timedelta
+from flask_login import current_user
+from sqlalchemy import func
+from app.ai_clients import ask_ai
+from app.jobs import enqueue, job_handler
+from app.models import db, Job, Lesson, TokenUsage
+from app.signals import lesson_content_changed
+from .outline_services import upcoming_lessons
+from .usage_services import record_token_usage
+
+# How many upcoming lessons to generate ahead of the learner
+PREFETCH_AHEAD = int(os.getenv('LESSON_PREFETCH_AHEAD', 2))
+# Prefetch jobs a single user may have queued or running at once
+PREFETCH_MAX_PENDING = int(os.getenv('LESSON_PREFETCH_MAX_PENDING', 2))
+# Output tokens a single user may spend on prefetching per rolling 24 hours. Prompt tokens aren't
+# counted: every lesson prompt carries the whole course outline, whatever the lesson's length
+PREFETCH_DAILY_TOKEN_BUDGET = int(os.getenv('LESSON_PREFETCH_DAILY_TOKEN_BUDGET', 40000))
+
+PREFETCH_JOB = 'lesson_prefetch'
+
+
+def _prefetch_tokens_spent(user_id):
+    since = datetime.utcnow() - timedelta(hours=24)
+    return db.session.query(func.coalesce(func.sum(TokenUsage.output_tokens), 0)).filter(
+        TokenUsage.user_id == user_id, TokenUsage.feature == 'lesson_prefetch', TokenUsage.created_at >= since
+    ).scalar()
+
+
+def schedule_lesson_prefetch(course, user, after_lesson=None):
+    """
+    Queue background generation for the next lessons of a course that have no content yet.
+    Respects the per-user pending-job limit and daily prefetch token budget. Returns the queued jobs.
+    """
+    if PREFETCH_AHEAD <= 0:
+        return []
+    try:
+        pending = Job.query.filter(Job.user_id == user.id, Job.kind == PREFETCH_JOB,
+                                   Job.status.in_(('queued', 'running'))).all()
+        slots = min(PREFETCH_AHEAD, PREFETCH_MAX_PENDING - len(pending))
+        if slots <= 0 or _prefetch_tokens_spent(user.id) >= PREFETCH_DAILY_TOKEN_BUDGET:
+            return []
+        pending_ids = {job.payload.get('lesson_id') for job in pending}
+
+        after_position = None
+        if after_lesson is not None:
+            if after_lesson.position is None:
+                return []
+            after_position = after_lesson.position
+
+        upcoming = upcoming_lessons(course.id, after_position, without_content=True, limit=slots + len(pending_ids))
+        queued = []
+        for lesson in upcoming:
+            if len(queued) >= slots:
+                break
+            if str(lesson.id) in pending_ids:
+                continue
+            queued.append(enqueue(PREFETCH_JOB, {'lesson_id': str(lesson.id)}, user_id=user.id))
+        return queued
+    except Exception as e:
+        # Prefetching is an optimization; never fail the request that triggered it
+        db.session.rollback()
+        print(f"Error scheduling lesson prefetch: {e}")
+        return []
+
+
+@job_handler(PREFETCH_JOB)
+def prefetch_lesson(payload):
+    """Background job: generate a lesson's content so opening it later is instant. Does not mark it completed."""
+    from .lesson_services import build_lesson_prompt, render_lesson_html
+
+    lesson = db.session.get(Lesson, payload['lesson_id'])
+    if lesson is None or lesson.content_hash is not None:
+        return {'skipped': True, 'tokens': 0}
+
+    markdown_text, tokens = ask_ai(build_lesson_prompt(lesson, current_user), model="gpt-4o")
+    record_token_usage('lesson_prefetch', tokens)
+
+    db.session.refresh(lesson)
+    if lesson.content_hash is not None:
+        # The learner opened the lesson and generated it while we were working
+        return {'skipped': True, 'tokens': tokens}
+    if "Error:" in markdown_text:
+        return {'skipped': True, 'tokens': tokens}
+    lesson.html_content = render_lesson_html(lesson, current_user, markdown_text)
+    db.session.commit()
+    lesson_content_changed.send(lesson, previous_hash=None, content_hash=lesson.content_hash)
+    return {'tokens': tokens}
@@ -0,0 +1,38 @@
+"""
+Course progress counters.
+
+Course.completed_lessons and Course.total_lessons are denormalized so progress checks
+never count lessons. They are only changed here, with relative UPDATEs, so concurrent
+requests (two tabs finishing lessons, a generation thread) can't overwrite each other.
+None of these commit; the caller commits with the rest of its changes.
+"""
+
+from sqlalchemy import update
+from app.models import db, Course, Lesson
+
+
+def mark_lesson_completed(lesson):
+    """
+    Flip the lesson to completed and count it on its course.
+    Returns True only for the request that actually flipped it, so follow-up work runs once.
+    """
+    flipped = db.session.execute(
+        update(Lesson)
+        .where(Lesson.id == lesson.id, Lesson.is_completed.is_(False))
+        .values(is_completed=True)
+    ).rowcount
+    if flipped:
+        adjust_lesson_counts(lesson.course_id, completed=1)
+    return bool(flipped)
+
+
+def adjust_lesson_counts(course_id, total=0, completed=0):
+    """Add the given deltas to a course's lesson counters."""
+    if not (total or completed):
+        return
+    db.session.execute(
+        update(Course)
+        .where(Course.id == course_id)
+        .values(total_lessons=Course.total_lessons + total,
+                completed_lessons=Course.completed_lessons + completed)
+    )
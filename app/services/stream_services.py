@@ -0,0 +1,269 @@
+"""
+Resumable lesson generation streams.
+
+A lesson is generated at most once at a time: the first request claims the lesson's
+LessonGeneration row and starts a background thread that runs the model and appends
+every chunk to an in-process GenerationBuffer and to the lesson_chunks table. Readers
+follow the generation by offset, so a reconnecting client (Last-Event-ID) or a second
+tab picks up where it left off instead of paying for another generation. Readers in
+other processes follow the persisted chunks.
+
+Event ids are "<attempt>:<seq>". If a generation is restarted (the previous one failed
+or its process died) the attempt number changes and readers are told to reset.
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_login import current_user
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app.jobs import maintenance_task, user_request_context
+from app.models import db, Lesson, LessonChunk, LessonGeneration
+from .lesson_services import generate_lesson_content_service
+
+# A running generation whose heartbeat is older than this is considered abandoned and may be taken over
+STALE_AFTER = int(os.getenv('LESSON_STREAM_STALE_AFTER', 90))
+# How often readers in other processes poll the database for new chunks
+DB_POLL_INTERVAL = float(os.getenv('LESSON_STREAM_POLL_INTERVAL', 0.5))
+KEEPALIVE_INTERVAL = 15
+# Chunks of finished generations are kept this long for late reconnects
+CHUNK_RETENTION = timedelta(hours=1)
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+class GenerationBuffer:
+    """Chunks of one generation attempt, shared by every reader in this process."""
+
+    def __init__(self, lesson_id, attempt):
+        self.lesson_id = lesson_id
+        self.attempt = attempt
+        self.chunks = []
+        self.status = 'running'
+        self._cond = threading.Condition()
+
+    def append(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, status):
+        with self._cond:
+            self.status = status
+            self._cond.notify_all()
+
+    def wait_for(self, offset, timeout):
+        """Return (chunks from offset on, status), waiting up to timeout for something new."""
+        with self._cond:
+            if len(self.chunks) <= offset and self.status == 'running':
+                self._cond.wait(timeout)
+            return self.chunks[offset:], self.status
+
+
+def parse_event_id(event_id):
+    """Split a Last-Event-ID into (attempt, next offset); (None, 0) when absent or malformed."""
+    try:
+        attempt, seq = event_id.split(':')
+        return int(attempt), int(seq) + 1
+    except (AttributeError, ValueError):
+        return None, 0
+
+
+def _claim_generation(lesson_id):
+    """Claim the right to generate a lesson. Returns the attempt number, or None if someone else holds it."""
+    generation = db.session.get(LessonGeneration, lesson_id)
+    if generation is None:
+        try:
+            db.session.add(LessonGeneration(lesson_id=lesson_id))
+            db.session.commit()
+            return 1
+        except IntegrityError:
+            db.session.rollback()
+            return None
+
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_AFTER)
+    if generation.status == 'running' and generation.heartbeat_at >= cutoff:
+        return None
+    attempt = generation.attempt + 1
+    claimed = db.session.execute(
+        update(LessonGeneration)
+        .where(LessonGeneration.lesson_id == lesson_id, LessonGeneration.attempt == generation.attempt)
+        .values(attempt=attempt, status='running', chunk_count=0,
+                started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return None
+    LessonChunk.query.filter_by(lesson_id=lesson_id).delete(synchronize_session=False)
+    db.session.commit()
+    return attempt
+
+
+def ensure_generation(lesson):
+    """
+    Make sure the lesson's content is being generated somewhere, starting a background
+    generation in this process if nobody else is. Returns the local buffer, if any.
+    """
+    with _buffers_lock:
+        buffer = _buffers.get(lesson.id)
+    if buffer is not None:
+        return buffer
+    if lesson.content_hash is not None:
+        return None
+    # The database claim decides between concurrent requests, in this process or another; the lock
+    # only guards the dict, so opening other lessons doesn't wait on this round trip
+    attempt = _claim_generation(lesson.id)
+    if attempt is None:
+        return None
+    buffer = GenerationBuffer(lesson.id, attempt)
+    with _buffers_lock:
+        _buffers[lesson.id] = buffer
+
+    thread = threading.Thread(target=_produce, name=f'lesson-generation-{lesson.id}',
+                              args=(current_app._get_current_object(), buffer, current_user.id), daemon=True)
+    thread.start()
+    return buffer
+
+
+def _produce(app, buffer, user_id):
+    """Run one generation attempt, persisting every chunk as it arrives."""
+    status = 'failed'
+    try:
+        with user_request_context(app, user_id):
+            try:
+                lesson = db.session.get(Lesson, buffer.lesson_id)
+                for chunk in generate_lesson_content_service(lesson, current_user):
+                    if not chunk:
+                        continue
+                    db.session.add(LessonChunk(lesson_id=buffer.lesson_id, seq=len(buffer.chunks), content=chunk))
+                    db.session.execute(
+                        update(LessonGeneration)
+                        .where(LessonGeneration.lesson_id == buffer.lesson_id,
+                               LessonGeneration.attempt == buffer.attempt)
+                        .values(chunk_count=len(buffer.chunks) + 1, heartbeat_at=datetime.utcnow())
+                    )
+                    db.session.commit()
+                    buffer.append(chunk)
+                status = 'done'
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error generating lesson {buffer.lesson_id}: {e}")
+            db.session.execute(
+                update(LessonGeneration)
+                .where(LessonGeneration.lesson_id == buffer.lesson_id, LessonGeneration.attempt == buffer.attempt)
+                .values(status=status, heartbeat_at=datetime.utcnow())
+            )
+            db.session.commit()
+    except Exception as e:
+        print(f"Error finishing lesson generation {buffer.lesson_id}: {e}")
+    finally:
+        with _buffers_lock:
+            _buffers.pop(buffer.lesson_id, None)
+        buffer.finish(status)
+
+
+def follow_generation(lesson_id, attempt=None, offset=0):
+    """
+    Yield the lesson's generation as events: ('chunk', attempt, seq, text), ('reset', attempt),
+    ('keepalive',) and finally ('done',) or ('failed',).
+    Chunks before offset of the given attempt are skipped, which is how reconnects resume.
+    """
+    # Streams stay open for minutes; don't hold a pooled connection while waiting
+    db.session.rollback()
+    last_sent = time.monotonic()
+    while True:
+        buffer = _buffers.get(lesson_id)
+        if buffer is not None:
+            if attempt != buffer.attempt:
+                if attempt is not None:
+                    yield ('reset', buffer.attempt)
+                attempt, offset = buffer.attempt, 0
+            chunks, status = buffer.wait_for(offset, KEEPALIVE_INTERVAL)
+        else:
+            # Generated by another process (or already finished); follow the persisted chunks
+            db.session.rollback()
+            generation = db.session.get(LessonGeneration, lesson_id)
+            if generation is None:
+                yield ('failed',)
+                return
+            if attempt != generation.attempt:
+                if attempt is not None:
+                    yield ('reset', generation.attempt)
+                attempt, offset = generation.attempt, 0
+            chunks = [c.content for c in LessonChunk.query.filter(LessonChunk.lesson_id == lesson_id,
+                                                                  LessonChunk.seq >= offset)
+                      .order_by(LessonChunk.seq)]
+            status = generation.status
+            stale = generation.heartbeat_at < datetime.utcnow() - timedelta(seconds=STALE_AFTER)
+            db.session.rollback()
+            if status == 'running' and stale:
+                # The generating process died; take over
+                ensure_generation(db.session.get(Lesson, lesson_id))
+                continue
+
+        for chunk in chunks:
+            yield ('chunk', attempt, offset, chunk)
+            offset += 1
+        if chunks:
+            last_sent = time.monotonic()
+        elif status == 'done':
+            yield ('done',)
+            return
+        elif status == 'failed':
+            yield ('failed',)
+            return
+        elif time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+            yield ('keepalive',)
+            last_sent = time.monotonic()
+
+        if buffer is None and not chunks:
+            time.sleep(DB_POLL_INTERVAL)
+
+
+def lesson_event_stream(lesson, last_event_id=None):
+    """Format follow_generation() as a server-sent events stream."""
+    yield 'retry: 2000\n\n'
+    if lesson.content_hash is not None and not _buffers.get(lesson.id):
+        yield 'event: done\ndata: {}\n\n'
+        return
+    lesson_id = lesson.id
+    ensure_generation(lesson)
+    attempt, offset = parse_event_id(last_event_id)
+    for event in follow_generation(lesson_id, attempt, offset):
+        kind = event[0]
+        if kind == 'chunk':
+            _, attempt, seq, text = event
+            yield f'id: {attempt}:{seq}\ndata: {json.dumps({"text": text})}\n\n'
+        elif kind == 'reset':
+            yield f'event: reset\ndata: {json.dumps({"attempt": event[1]})}\n\n'
+        elif kind == 'keepalive':
+            yield ': keep-alive\n\n'
+        else:
+            yield f'event: {kind}\ndata: {{}}\n\n'
+
+
+def lesson_text_stream(lesson):
+    """Plain-text stream of the lesson markdown, sharing the generation with any other readers."""
+    if lesson.content_hash is not None and not _buffers.get(lesson.id):
+        return
+    lesson_id = lesson.id
+    ensure_generation(lesson)
+    for event in follow_generation(lesson_id):
+        if event[0] == 'chunk':
+            yield event[3]
+
+
+@maintenance_task
+def purge_finished_lesson_chunks():
+    """Drop persisted chunks of generations that finished a while ago; the lesson HTML is the durable copy."""
+    cutoff = datetime.utcnow() - CHUNK_RETENTION
+    finished = db.session.query(LessonGeneration.lesson_id).filter(
+        LessonGeneration.status != 'running', LessonGeneration.heartbeat_at < cutoff)
+    deleted = LessonChunk.query.filter(LessonChunk.lesson_id.in_(finished)).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
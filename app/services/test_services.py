@@ -1,19 +1,21 @@
 import json
+import re
 from models.json_extractor import JsonExtractor
 from models.fulltest import Test
 from models.question import Question
 from app.ai_clients import ask_gemini
-from .utils import update_token_count
+from .usage_services import record_token_usage
 from models.prompt_builders import TestPromptBuilder, AnswerPromptBuilder
 
-def generate_test_service(topic, format_type, additional_context, language, user_profile=None, lesson_content_context=""):
+def generate_test_service(topic, format_type, additional_context, language, user_profile=None, lesson_content_context="",
+                          cache=False):
     prompt = TestPromptBuilder.build_multiple_choice_prompt(
         topic, additional_context, language,
         user_profile=user_profile,
         lesson_content_context=lesson_content_context
     )
-    raw_output, tokens = ask_gemini(prompt, json_mode=True)
-    update_token_count(tokens)
+    raw_output, tokens = ask_gemini(prompt, json_mode=True, cache=cache)
+    record_token_usage('test_generation', tokens)
 
     if not raw_output or "Error:" in raw_output:
         print(f"Failed to generate test with Gemini. AI response: {raw_output}")
@@ -51,7 +53,7 @@ def evaluate_answers_service(questions, user_answers, language):
         language
     )
     response_text, tokens = ask_gemini(prompt, json_mode=True)
-    update_token_count(tokens)
+    record_token_usage('answer_evaluation', tokens)
 
     if not response_text or "Error:" in response_text:
         return []
@@ -86,6 +88,13 @@ def calculate_percentage_score_service(detailed_results):
         prompt += f"Q: {result['question']}\nA: {result['answer']}\nAssessment: {result['assessment']}\n\n"
     prompt += "Return just the number."
     result_text, tokens = ask_gemini(prompt, json_mode=False)
-    update_token_count(tokens)
+    record_token_usage('test_scoring', tokens)
+    return _parse_percentage(result_text)
 
-    return int(''.join(filter(str.isdigit, result_text))) if result_text and "Error:" not in result_text else 0
+
+def _parse_percentage(result_text):
+    """The first integer in the reply, clamped to 0-100 ("85/100" is 85), or None if there is none."""
+    if not result_text or "Error:" in result_text:
+        return None
+    match = re.search(r'\d+', result_text)
+    return min(max(int(match.group()), 0), 100) if match else None
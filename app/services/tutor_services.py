@@ -1,13 +1,214 @@
-from app.ai_clients import ask_gemini_stream
+"""
+Tutor chat.
+
+Conversations are stored per (user, lesson), so the client only sends its new message. Each
+prompt carries a rolling summary of the older turns plus a window of the most recent ones that
+fits CHAT_WINDOW_TOKENS, which keeps the prompt the same size however long the chat gets.
+Once turns fall out of the window a background job folds them into the summary.
+"""
+
+import os
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app.ai_clients import AICall, ask_ai, ask_gemini_stream
+from app.jobs import enqueue, job_handler
+from app.models import db, ChatConversation, ChatMessage, Job
 from models.prompt_builders import ChatPromptBuilder
+from .artifact_services import lesson_artifact
+from .context_services import CHARS_PER_TOKEN, estimate_tokens
+from .usage_services import record_token_usage
+
+SUMMARY_JOB = 'chat_summary'
+# Recent turns sent verbatim with every question: at most this many messages and tokens
+CHAT_WINDOW_MESSAGES = int(os.getenv('CHAT_WINDOW_MESSAGES', 12))
+CHAT_WINDOW_TOKENS = int(os.getenv('CHAT_WINDOW_TOKENS', 1500))
+# Messages left out of the summary when it is updated, so it isn't rewritten on every turn
+CHAT_SUMMARY_KEEP = int(os.getenv('CHAT_SUMMARY_KEEP', 4))
+CHAT_SUMMARY_TOKENS = int(os.getenv('CHAT_SUMMARY_TOKENS', 300))
+# Longest question accepted from the client
+CHAT_MESSAGE_MAX_CHARS = int(os.getenv('CHAT_MESSAGE_MAX_CHARS', 2000))
+
+
+def _get_conversation(user_id, lesson_id):
+    conversation = ChatConversation.query.filter_by(user_id=user_id, lesson_id=lesson_id).first()
+    if conversation is not None:
+        return conversation
+    conversation = ChatConversation(user_id=user_id, lesson_id=lesson_id)
+    db.session.add(conversation)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Started at the same time from another tab
+        db.session.rollback()
+        conversation = ChatConversation.query.filter_by(user_id=user_id, lesson_id=lesson_id).one()
+    return conversation
+
+
+def _append_message(conversation_id, role, content):
+    """Store the next message of the conversation. The counter is bumped in SQL so concurrent turns get distinct seqs."""
+    db.session.execute(
+        update(ChatConversation)
+        .where(ChatConversation.id == conversation_id)
+        .values(message_count=ChatConversation.message_count + 1, updated_at=datetime.utcnow())
+    )
+    seq = db.session.query(ChatConversation.message_count).filter_by(id=conversation_id).scalar()
+    message = ChatMessage(conversation_id=conversation_id, seq=seq, role=role, content=content,
+                          tokens=estimate_tokens(content))
+    db.session.add(message)
+    return message
 
-def get_tutor_response_service(lesson, chat_history, user_question, user):
-    lesson_content = lesson.html_content or "Lesson content has not been generated yet."
+
+def _window(conversation):
+    """
+    The most recent unsummarized messages within the window, oldest first, as prompt history. The
+    message that crosses CHAT_WINDOW_TOKENS is cut to what is left of it (and marked truncated), so a
+    long answer can't grow the prompt.
+    """
+    recent = (ChatMessage.query
+              .filter(ChatMessage.conversation_id == conversation.id,
+                      ChatMessage.seq > conversation.summarized_through)
+              .order_by(ChatMessage.seq.desc())
+              .limit(CHAT_WINDOW_MESSAGES)
+              .all())
+    window, used = [], 0
+    for message in recent:
+        room = CHAT_WINDOW_TOKENS - used
+        if room <= 0:
+            break
+        truncated = message.tokens > room
+        content = message.content[:room * CHARS_PER_TOKEN].rstrip() + '…' if truncated else message.content
+        window.append({'role': message.role, 'content': content, 'truncated': truncated})
+        used += min(message.tokens, room)
+        if truncated:
+            break
+    return window[::-1]
+
+
+def recent_chat_messages(user_id, lesson_id, limit=CHAT_WINDOW_MESSAGES):
+    """The last messages of the user's chat about a lesson, oldest first, for showing the conversation again."""
+    messages = (ChatMessage.query
+                .join(ChatConversation, ChatConversation.id == ChatMessage.conversation_id)
+                .filter(ChatConversation.user_id == user_id, ChatConversation.lesson_id == lesson_id)
+                .order_by(ChatMessage.seq.desc())
+                .limit(limit)
+                .all())
+    return messages[::-1]
+
+
+def get_tutor_response_service(lesson, user_question, user):
+    # The plain-text artifact carries the same material as the HTML in a fraction of the tokens
+    artifact = lesson_artifact(lesson)
+    lesson_content = artifact.plain_text if artifact else lesson.html_content
+    lesson_content = lesson_content or "Lesson content has not been generated yet."
+
+    conversation = _get_conversation(user.id, lesson.id)
+    window = _window(conversation)
     prompt = ChatPromptBuilder.build_tutor_prompt(
         lesson_content=lesson_content,
         unit_title=lesson.unit_title,
-        chat_history=chat_history,
+        chat_history=window,
         user_question=user_question,
-        language=user.language
+        language=user.language,
+        conversation_summary=conversation.summary
+    )
+    question = _append_message(conversation.id, 'user', user_question)
+    db.session.commit()
+
+    response_stream = ask_gemini_stream(prompt)
+    # Read now: the route releases the session before streaming
+    user_id, conversation_id, question_seq = user.id, conversation.id, question.seq
+
+    def answer_generator():
+        parts = []
+        try:
+            for part in response_stream:
+                parts.append(part)
+                yield part
+        finally:
+            # Also when the client disconnects or the stream fails part way: the tokens are spent,
+            # and the question must not be left in the conversation without an answer
+            response_stream.close()
+            answer = ''.join(parts)
+            call = response_stream.call or AICall(None, estimate_tokens(prompt), estimate_tokens(answer),
+                                                  estimate_tokens(prompt) + estimate_tokens(answer), None, False, True)
+            record_token_usage('tutor_chat', call.total_tokens, user_id=user_id, call=call)
+            _save_answer(conversation_id, question_seq, answer, user_id)
+
+    return answer_generator()
+
+
+def _drop_question(conversation_id, seq):
+    """Remove a question that got no answer at all, so the window never holds two user turns in a row."""
+    ChatMessage.query.filter_by(conversation_id=conversation_id, seq=seq).delete(synchronize_session=False)
+    # Give the seq back unless a later message has taken the next one
+    db.session.execute(
+        update(ChatConversation)
+        .where(ChatConversation.id == conversation_id, ChatConversation.message_count == seq)
+        .values(message_count=ChatConversation.message_count - 1)
+    )
+
+
+def _summary_pending(conversation_id, user_id):
+    """Whether a summary job for the conversation is already queued or running (later turns re-check once it is done)."""
+    pending = Job.query.filter(Job.user_id == user_id, Job.kind == SUMMARY_JOB,
+                               Job.status.in_(('queued', 'running'))).all()
+    return any(job.payload.get('conversation_id') == str(conversation_id) for job in pending)
+
+
+def _save_answer(conversation_id, question_seq, answer, user_id):
+    """Store the (possibly partial) answer to a question and schedule the summary if the window overflows."""
+    try:
+        if not answer:
+            _drop_question(conversation_id, question_seq)
+            db.session.commit()
+            return
+        _append_message(conversation_id, 'ai', answer)
+        db.session.commit()
+        conversation = db.session.get(ChatConversation, conversation_id)
+        # Summarize once messages no longer fit the window whole, i.e. the next prompt would lose (part of) them
+        unsummarized = conversation.message_count - conversation.summarized_through
+        window = _window(conversation)
+        if (unsummarized > len(window) or (window and window[0]['truncated'])) \
+                and not _summary_pending(conversation_id, user_id):
+            enqueue(SUMMARY_JOB, {'conversation_id': str(conversation_id)}, user_id=user_id)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving tutor answer: {e}")
+
+
+@job_handler(SUMMARY_JOB)
+def summarize_conversation(payload):
+    """Background job: fold all but the last CHAT_SUMMARY_KEEP unsummarized messages into the summary."""
+    conversation = db.session.get(ChatConversation, payload['conversation_id'])
+    if conversation is None:
+        return {'skipped': True, 'tokens': 0}
+    through = conversation.message_count - CHAT_SUMMARY_KEEP
+    messages = (ChatMessage.query
+                .filter(ChatMessage.conversation_id == conversation.id,
+                        ChatMessage.seq > conversation.summarized_through,
+                        ChatMessage.seq <= through)
+                .order_by(ChatMessage.seq)
+                .all())
+    if not messages:
+        return {'skipped': True, 'tokens': 0}
+
+    prompt = ChatPromptBuilder.build_conversation_summary_prompt(
+        conversation.summary,
+        [{'role': message.role, 'content': message.content} for message in messages],
+        max_words=CHAT_SUMMARY_TOKENS * 3 // 4,
+    )
+    summary, tokens = ask_ai(prompt)
+    record_token_usage('tutor_chat_summary', tokens)
+    if not summary or "Error:" in summary:
+        raise RuntimeError(f"Conversation summary failed: {summary}")
+
+    # Only if no other job summarized the conversation in the meantime
+    db.session.execute(
+        update(ChatConversation)
+        .where(ChatConversation.id == conversation.id,
+               ChatConversation.summarized_through == conversation.summarized_through)
+        .values(summary=summary.strip()[:CHAT_SUMMARY_TOKENS * CHARS_PER_TOKEN], summarized_through=messages[-1].seq)
     )
-    return ask_gemini_stream(prompt)
+    db.session.commit()
+    return {'tokens': tokens, 'summarized_through': messages[-1].seq}
@@ -0,0 +1,136 @@
+"""
+Token usage ledger.
+
+Every AI call made for a user is recorded as a TokenUsage row (feature, model, prompt, output
+and total tokens as the model reported them, latency). Rows are buffered on the application context and written in one
+multi-row INSERT, together with a single atomic increment of User.tokens_used per user,
+when the request ends or the buffer reaches TOKEN_USAGE_FLUSH_BATCH entries, instead of a
+commit after every call.
+"""
+
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import g, has_app_context
+from flask_login import current_user
+from sqlalchemy import Integer, cast, func, insert, update
+from app.ai_clients import last_ai_call
+from app.models import db, TokenUsage, User
+
+TOKEN_USAGE_FLUSH_BATCH = int(os.getenv('TOKEN_USAGE_FLUSH_BATCH', 20))
+
+# List prices in USD per million (input, output) tokens; output includes thinking tokens.
+# Models not listed are reported without a cost.
+MODEL_PRICES = {
+    'gemini-2.5-pro': (1.25, 10.00),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.0-flash': (0.10, 0.40),
+}
+
+
+def record_token_usage(feature, tokens, user_id=None, call=None):
+    """
+    Charge an AI call to the user (the current user by default). tokens is the total ask_ai() returned;
+    the model, prompt/output split and latency come from call, by default last_ai_call(), i.e. the
+    ask_ai() call that just returned or the ask_ai_stream() just exhausted. Nothing is written until
+    the buffer is flushed.
+    """
+    if user_id is None:
+        if not current_user or not current_user.is_authenticated:
+            return
+        user_id = current_user.id
+    call = call or last_ai_call()
+    if tokens <= 0 and (call is None or call.cached):
+        return
+    buffer = g.setdefault('token_usage', [])
+    buffer.append({
+        'user_id': user_id,
+        'feature': feature,
+        'model': call.model if call else None,
+        'prompt_tokens': call.prompt_tokens if call else 0,
+        'output_tokens': call.output_tokens if call else tokens,
+        'total_tokens': tokens,
+        'estimated': call.estimated if call else True,
+        'latency_ms': call.latency_ms if call else None,
+        'created_at': datetime.utcnow(),
+    })
+    if len(buffer) >= TOKEN_USAGE_FLUSH_BATCH:
+        flush_token_usage()
+
+
+def flush_token_usage():
+    """Write the buffered usage rows and the users' totals, and commit. Returns the number of rows written."""
+    rows = g.pop('token_usage', None) if has_app_context() else None
+    if not rows:
+        return 0
+    db.session.execute(insert(TokenUsage), rows)
+    totals = Counter()
+    for row in rows:
+        totals[row['user_id']] += row['total_tokens']
+    for user_id, tokens in totals.items():
+        if tokens:
+            db.session.execute(update(User).where(User.id == user_id)
+                               .values(tokens_used=User.tokens_used + tokens))
+    db.session.commit()
+    return len(rows)
+
+
+def token_usage_by_feature(days=7):
+    """
+    Calls, tokens, latency and list-price cost per feature over the last `days` days, most expensive
+    first, to find the prompts that spend the budget.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.query(
+        TokenUsage.feature, TokenUsage.model, func.count(TokenUsage.id),
+        func.sum(TokenUsage.prompt_tokens), func.sum(TokenUsage.output_tokens), func.sum(TokenUsage.total_tokens),
+        func.avg(TokenUsage.latency_ms), func.sum(cast(TokenUsage.estimated, Integer)),
+    ).filter(TokenUsage.created_at >= since).group_by(TokenUsage.feature, TokenUsage.model).all()
+
+    features = {}
+    for feature, model, calls, prompt_tokens, output_tokens, total_tokens, latency, estimated in rows:
+        entry = features.setdefault(feature, {
+            'feature': feature, 'calls': 0, 'estimated_calls': 0, 'prompt_tokens': 0, 'output_tokens': 0,
+            'total_tokens': 0, 'avg_latency_ms': None, 'cost_usd': 0.0, 'models': [], '_latency': 0.0,
+        })
+        entry['calls'] += calls
+        entry['estimated_calls'] += int(estimated or 0)
+        entry['prompt_tokens'] += int(prompt_tokens or 0)
+        entry['output_tokens'] += int(output_tokens or 0)
+        entry['total_tokens'] += int(total_tokens or 0)
+        entry['_latency'] += float(latency or 0) * calls
+        entry['models'].append(model)
+        prices = MODEL_PRICES.get(model)
+        if prices and entry['cost_usd'] is not None:
+            # Everything that isn't prompt is billed at the output rate
+            billed_output = int(total_tokens or 0) - int(prompt_tokens or 0)
+            entry['cost_usd'] += (int(prompt_tokens or 0) * prices[0] + billed_output * prices[1]) / 1e6
+        else:
+            entry['cost_usd'] = None
+    for entry in features.values():
+        entry['avg_latency_ms'] = round(entry.pop('_latency') / entry['calls']) if entry['calls'] else None
+        entry['avg_prompt_tokens'] = round(entry['prompt_tokens'] / entry['calls']) if entry['calls'] else 0
+        if entry['cost_usd'] is not None:
+            entry['cost_usd'] = round(entry['cost_usd'], 4)
+    return sorted(features.values(), key=lambda e: (e['cost_usd'] or 0, e['total_tokens']), reverse=True)
+
+
+def init_token_usage(app):
+    """
+    Flush whatever is still buffered when a request ends (jobs run inside a request context too),
+    or an app context without one, e.g. a background generation thread.
+    """
+
+    def _flush_token_usage(exc):
+        if not g.get('token_usage'):
+            return
+        if exc is not None:
+            db.session.rollback()
+        try:
+            flush_token_usage()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[USAGE] Could not write token usage: {e}")
+
+    app.teardown_request(_flush_token_usage)
+    app.teardown_appcontext(_flush_token_usage)
@@ -0,0 +1,78 @@
+"""
+Server-side sessions stored in the database.
+
+Flask-Session's own SQLAlchemy backend creates its table when the app is imported and
+reads and commits through the app's db.session, so saving the session could commit
+whatever a request left pending. This backend uses the same `sessions` table, created by
+the migrations only, and talks to it on a connection of its own.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+import sqlalchemy as sa
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+from flask_session.defaults import Defaults
+from itsdangerous import want_bytes
+
+
+class SqlSession(ServerSideSession):
+    pass
+
+
+class SqlSessionInterface(ServerSideSessionInterface):
+    """Sessions in the `sessions` table. The database has no TTL, so expired rows are deleted by delete_expired()."""
+
+    session_class = SqlSession
+    ttl = False
+
+    def __init__(self, app, db, key_prefix=Defaults.SESSION_KEY_PREFIX, permanent=Defaults.SESSION_PERMANENT,
+                 sid_length=Defaults.SESSION_ID_LENGTH,
+                 serialization_format=Defaults.SESSION_SERIALIZATION_FORMAT,
+                 cleanup_n_requests=Defaults.SESSION_CLEANUP_N_REQUESTS):
+        self.db = db
+        # On the app's metadata so db.create_all() knows it, but never created from here
+        self.table = sa.Table(
+            'sessions', db.metadata,
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('session_id', sa.String(255), unique=True),
+            sa.Column('data', sa.LargeBinary),
+            sa.Column('expiry', sa.DateTime),
+        )
+        super().__init__(app, key_prefix, False, permanent, sid_length, serialization_format, cleanup_n_requests)
+
+    def delete_expired(self) -> int:
+        """Delete expired sessions; returns how many."""
+        with self.db.engine.begin() as conn:
+            return conn.execute(sa.delete(self.table).where(self.table.c.expiry <= datetime.utcnow())).rowcount
+
+    def _delete_expired_sessions(self) -> None:
+        # Used by Flask-Session's SESSION_CLEANUP_N_REQUESTS and `flask session_cleanup`
+        self.delete_expired()
+
+    def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        with self.db.engine.connect() as conn:
+            row = conn.execute(sa.select(self.table.c.data, self.table.c.expiry)
+                               .where(self.table.c.session_id == store_id)).first()
+        # Expired rows are left to delete_expired(); reading one doesn't need a write
+        if row is None or row.expiry is None or row.expiry <= datetime.utcnow():
+            return None
+        return self.serializer.decode(want_bytes(row.data))
+
+    def _delete_session(self, store_id: str) -> None:
+        with self.db.engine.begin() as conn:
+            conn.execute(sa.delete(self.table).where(self.table.c.session_id == store_id))
+
+    def _upsert_session(self, session_lifetime, session: ServerSideSession, store_id: str) -> None:
+        values = {'data': self.serializer.encode(session), 'expiry': datetime.utcnow() + session_lifetime}
+        update = sa.update(self.table).where(self.table.c.session_id == store_id).values(**values)
+        with self.db.engine.begin() as conn:
+            if conn.execute(update).rowcount:
+                return
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(sa.insert(self.table).values(session_id=store_id, **values))
+        except sa.exc.IntegrityError:
+            # Inserted by a concurrent request of the same session
+            with self.db.engine.begin() as conn:
+                conn.execute(update)
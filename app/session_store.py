@@ -0,0 +1,65 @@
+"""
+Server-side records for large session values.
+
+Tests, answer sheets and graded results can be tens of kilobytes; keeping them in the
+session means reading and writing them on every request, whichever backend stores it.
+put_payload() moves such a value into a SessionPayload row and leaves only its id in
+the session. Payloads expire on their own and are swept by workers together with
+expired sessions.
+"""
+
+import os
+from datetime import datetime, timedelta
+from flask import current_app, session
+from flask_login import current_user
+from app.configuration import db
+from app.jobs import maintenance_task
+from app.models import SessionPayload
+from app.session_backend import SqlSessionInterface
+
+PAYLOAD_LIFETIME = timedelta(hours=int(os.getenv('SESSION_PAYLOAD_TTL_HOURS', 24)))
+
+
+def put_payload(key, value):
+    """Store value server-side and keep only a reference to it in session[key]."""
+    pop_payload(key)
+    payload = SessionPayload(
+        user_id=current_user.id if current_user.is_authenticated else None,
+        data=value,
+        expires_at=datetime.utcnow() + PAYLOAD_LIFETIME,
+    )
+    db.session.add(payload)
+    db.session.commit()
+    session[key] = str(payload.id)
+    return value
+
+
+def get_payload(key, default=None):
+    """Return the value stored with put_payload(), or default if it is missing or expired."""
+    payload_id = session.get(key)
+    if not payload_id:
+        return default
+    payload = db.session.get(SessionPayload, payload_id)
+    if payload is None or payload.expires_at < datetime.utcnow():
+        return default
+    return payload.data
+
+
+def pop_payload(key):
+    """Remove session[key] and the record it points to."""
+    payload_id = session.pop(key, None)
+    if payload_id:
+        SessionPayload.query.filter_by(id=payload_id).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@maintenance_task
+def purge_expired_session_data():
+    deleted = SessionPayload.query.filter(SessionPayload.expires_at < datetime.utcnow()).delete(
+        synchronize_session=False)
+    db.session.commit()
+    # The SQL session table has no native expiry
+    interface = current_app.session_interface
+    if isinstance(interface, SqlSessionInterface):
+        interface.delete_expired()
+    return deleted
@@ -0,0 +1,12 @@
+"""
+Application signals.
+Services send them after the change is committed; other services connect receivers to react.
+"""
+
+from blinker import Namespace
+
+_signals = Namespace()
+
+# Sender: the Lesson. Sent after new content for it is committed (first generation or regeneration),
+# with previous_hash (None the first time) and content_hash.
+lesson_content_changed = _signals.signal('lesson-content-changed')
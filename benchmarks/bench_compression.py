@@ -0,0 +1,99 @@
+"""
+Storage and read benchmark for compressed lesson HTML.
+
+Takes the generated lesson HTML found in a database (instance/quillio.db by default),
+writes --rows copies of it into two fresh SQLite files, one as plain Text and one as
+CompressedText, and reports file size and read throughput for each. Every copy is made
+unique, so the numbers are about compression, not about content sharing.
+
+Usage: python benchmarks/bench_compression.py [--source instance/quillio.db] [--rows 5000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, create_engine, insert, select  # noqa: E402
+from app.db_utils import CompressedText, compress_text  # noqa: E402
+
+
+def _samples(source):
+    """Lesson HTML from either schema: lessons.html_content or lesson_contents.html."""
+    from app.db_utils import decompress_text
+
+    connection = sqlite3.connect(source)
+    try:
+        try:
+            rows = connection.execute("SELECT html FROM lesson_contents").fetchall()
+            return [decompress_text(html) if isinstance(html, bytes) else html for html, in rows]
+        except sqlite3.OperationalError:
+            return [html for html, in connection.execute(
+                "SELECT html_content FROM lessons WHERE html_content IS NOT NULL")]
+    finally:
+        connection.close()
+
+
+def _bench(label, column_type, documents, workdir, repeat):
+    path = workdir / f"{label}.db"
+    engine = create_engine(f"sqlite:///{path}")
+    table = Table("lesson_contents", MetaData(), Column("id", Integer, primary_key=True),
+                  Column("html", column_type, nullable=False))
+    table.metadata.create_all(engine)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(table), [{"id": i, "html": html} for i, html in enumerate(documents)])
+    write_time = time.perf_counter() - started
+    with engine.begin() as conn:
+        conn.exec_driver_sql("VACUUM")
+    engine.dispose()
+    size = os.path.getsize(path)
+
+    engine = create_engine(f"sqlite:///{path}")
+    best = float("inf")
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            loaded = conn.execute(select(table.c.html)).scalars().all()
+            best = min(best, time.perf_counter() - started)
+    assert loaded == documents
+    chars = sum(len(html) for html in documents)
+    print(f"{label:10s} file {size / 1e6:8.2f} MB   read {len(documents) / best:9,.0f} rows/s "
+          f"({chars / best / 1e6:6.1f} M chars/s)   write {len(documents) / write_time:9,.0f} rows/s")
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=str(ROOT / "instance" / "quillio.db"))
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    samples = _samples(args.source)
+    if not samples:
+        parser.error(f"no lesson HTML found in {args.source}")
+    documents = [f"{samples[i % len(samples)]}\n<!-- copy {i} -->" for i in range(args.rows)]
+
+    raw = sum(len(html.encode("utf-8")) for html in samples)
+    plain = sum(len(zlib.compress(html.encode("utf-8"), 9)) for html in samples)
+    primed = sum(len(compress_text(html)) for html in samples)
+    print(f"{len(samples)} distinct lessons, {raw / len(samples):,.0f} bytes on average")
+    print(f"compression ratio: zlib {raw / plain:.2f}x, zlib with lesson dictionary {raw / primed:.2f}x")
+
+    workdir = Path(tempfile.mkdtemp(prefix="quillio-compression-"))
+    text_size = _bench("text", Text(), documents, workdir, args.repeat)
+    compressed_size = _bench("compressed", CompressedText(), documents, workdir, args.repeat)
+    print(f"database size: {compressed_size / text_size:.0%} of uncompressed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
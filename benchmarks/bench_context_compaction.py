@@ -0,0 +1,97 @@
+"""
+Unit test context compaction benchmark.
+
+Builds units of --lessons lessons from the generated lesson HTML found in a database
+(instance/quillio.db by default), each lesson ending in the "Next up" link the app
+appends, and compares the context get_unit_test_data used to send (the lessons' HTML
+joined together) with compact_lessons() under the configured token budget: size,
+compression ratio and time spent compacting, cold and with the parsed lessons memoized.
+
+With --live and GEMINI_API_KEY set, also generates the test from both contexts and
+reports the model latency of each.
+
+Usage: python benchmarks/bench_context_compaction.py [--source instance/quillio.db] [--lessons 8] [--budget 6000] [--live]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# Importing the app creates its session table; keep that out of the real database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='quillio-context-')}/context.db")
+
+import app.configuration  # noqa: E402,F401  (the services package needs the app set up first)
+from app.services.context_services import compact_lessons, estimate_tokens  # noqa: E402
+
+NEXT_UP = ('\n<hr>\n\n<h3>👉 Next up: <a href="http://127.0.0.1:8000/loading/lesson/{n}">Lesson {n}</a></h3>')
+
+
+def _samples(source):
+    """Lesson HTML from either schema: lessons.html_content or lesson_contents.html."""
+    from app.db_utils import decompress_text
+
+    connection = sqlite3.connect(source)
+    try:
+        try:
+            rows = connection.execute("SELECT html FROM lesson_contents").fetchall()
+            return [decompress_text(html) if isinstance(html, bytes) else html for html, in rows]
+        except sqlite3.OperationalError:
+            return [html for html, in connection.execute(
+                "SELECT html_content FROM lessons WHERE html_content IS NOT NULL")]
+    finally:
+        connection.close()
+
+
+def _prompt(context):
+    from models.prompt_builders import TestPromptBuilder
+    return TestPromptBuilder.build_multiple_choice_prompt("Unit test", "Create 5-10 questions.",
+                                                          lesson_content_context=context)
+
+
+def _timed_generation(prompt):
+    from app.ai_clients import ask_ai, last_ai_call
+    started = time.perf_counter()
+    ask_ai(prompt, json_mode=True)
+    return time.perf_counter() - started, last_ai_call()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=str(ROOT / "instance" / "quillio.db"))
+    parser.add_argument("--lessons", type=int, default=8, help="lessons per unit")
+    parser.add_argument("--budget", type=int, default=None, help="token budget (default UNIT_TEST_CONTEXT_TOKENS)")
+    parser.add_argument("--live", action="store_true", help="also time test generation with the real model")
+    args = parser.parse_args()
+
+    samples = [html.split("<hr>")[0] for html in _samples(args.source)]
+    if not samples:
+        parser.error(f"no lesson HTML found in {args.source}")
+    units = []
+    for start in range(0, len(samples), args.lessons):
+        chosen = [samples[(start + i) % len(samples)] for i in range(args.lessons)]
+        units.append([(f"Lesson {i}", html + NEXT_UP.format(n=i + 1)) for i, html in enumerate(chosen)])
+
+    budget = {"max_tokens": args.budget} if args.budget else {}
+    for number, lessons in enumerate(units):
+        raw = "\n\n".join(html for _, html in lessons)
+        context = compact_lessons(lessons, **budget)
+        # Parsed lessons are memoized, so generating the same unit's test again is cheaper
+        warm = compact_lessons(lessons, **budget)
+        print(f"unit {number}: {estimate_tokens(raw):7,} -> {context.tokens:6,} tokens "
+              f"({context.ratio:5.2f}x) compacted in {context.elapsed_ms:6.1f} ms ({warm.elapsed_ms:.1f} ms warm)")
+
+        if args.live:
+            for label, text in (("raw", raw), ("compact", context.text)):
+                elapsed, call = _timed_generation(_prompt(text))
+                print(f"    {label:8s} {elapsed:6.2f} s  prompt {call.prompt_tokens:,} tokens"
+                      f"{' (estimated)' if call.estimated else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Micro-benchmark for the GUID column type on SQLite.
+
+Fills an in-memory table shaped like `lessons` (a unique id plus a course_id shared by
+a course's lessons) and times loading every row through SQLAlchemy, once with the
+previous GUID implementation and once per storage mode of the current one.
+
+Usage: python benchmarks/bench_guid.py [--rows 20000] [--per-course 50] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import Column, MetaData, Table, create_engine, insert, select  # noqa: E402
+from sqlalchemy.dialects.postgresql import UUID as PostgresUUID  # noqa: E402
+from sqlalchemy.types import CHAR, TypeDecorator  # noqa: E402
+from app.configuration import app  # noqa: E402,F401
+from app.models import GUID  # noqa: E402
+
+
+class LegacyGUID(TypeDecorator):
+    """GUID as it was before the fast path, for comparison."""
+    impl = CHAR
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(PostgresUUID())
+        return dialect.type_descriptor(CHAR(32))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            try:
+                if len(value) == 32 and all(c in '0123456789abcdef' for c in value.lower()):
+                    value = uuid.UUID(hex=value)
+                else:
+                    value = uuid.UUID(value)
+            except (ValueError, AttributeError):
+                return value
+        if isinstance(value, uuid.UUID):
+            if dialect.name == 'postgresql':
+                return str(value)
+            return "%.32x" % value.int
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        if isinstance(value, uuid.UUID):
+            return value
+        if isinstance(value, str) and len(value) == 32 and all(c in '0123456789abcdef' for c in value.lower()):
+            return uuid.UUID(hex=value)
+        try:
+            return uuid.UUID(str(value))
+        except (ValueError, AttributeError, TypeError):
+            return value
+
+
+def _bench(label, guid_type, rows, per_course, repeat):
+    engine = create_engine("sqlite://")
+    table = Table("lessons", MetaData(), Column("id", guid_type, primary_key=True),
+                  Column("course_id", guid_type, nullable=False))
+    table.metadata.create_all(engine)
+    course_ids = [uuid.uuid4() for _ in range(rows // per_course + 1)]
+    values = [{"id": uuid.uuid4(), "course_id": course_ids[i // per_course]} for i in range(rows)]
+
+    with engine.begin() as conn:
+        started = time.perf_counter()
+        conn.execute(insert(table), values)
+        insert_time = time.perf_counter() - started
+
+    best = float("inf")
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            loaded = conn.execute(select(table)).all()
+            best = min(best, time.perf_counter() - started)
+        assert isinstance(loaded[0].id, uuid.UUID) and len(loaded) == rows
+        # Lookups by a string id, as routes do with ids taken from URLs and JSON bodies
+        probe = str(values[rows // 2]["id"])
+        started = time.perf_counter()
+        for _ in range(1000):
+            conn.execute(select(table.c.course_id).where(table.c.id == probe)).scalar_one()
+        lookup_time = time.perf_counter() - started
+
+    print(f"{label:14s} load {rows / best:12,.0f} rows/s   insert {rows / insert_time:10,.0f} rows/s   "
+          f"lookup {lookup_time * 1000:6.1f} us/query")
+    return rows / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--per-course", type=int, default=50, help="rows sharing one course_id")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = _bench("legacy", LegacyGUID(), args.rows, args.per_course, args.repeat)
+    for label, guid_type in (("text", GUID(binary=False)), ("blob", GUID(binary=True))):
+        throughput = _bench(label, guid_type, args.rows, args.per_course, args.repeat)
+        print(f"{'':14s} {throughput / baseline:.2f}x legacy row-load throughput")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
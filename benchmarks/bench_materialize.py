@@ -0,0 +1,113 @@
+"""
+Course materialization benchmark.
+
+Creates courses with --lessons lessons each, the way course creation used to (commit the
+course, add every Lesson object, commit again, then derive the outline rows) and with
+materialize_course(), and reports courses per second and statements per course.
+
+Runs on a throwaway SQLite database by default; pass --url to run against another
+database, e.g. a disposable PostgreSQL one (tables are created if missing and the
+benchmark's rows are deleted afterwards).
+
+Usage: python benchmarks/bench_materialize.py [--lessons 1000] [--courses 5] [--url postgresql://...]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def _outline(lessons, per_unit=20):
+    units = []
+    for n in range((lessons + per_unit - 1) // per_unit):
+        count = min(per_unit, lessons - n * per_unit)
+        units.append({"unit_title": f"Unit {n}", "test": {"test_title": f"Test {n}"},
+                      "lessons": [{"lesson_title": f"Lesson {n}.{i}"} for i in range(count)]})
+    return {"course_title": "Benchmark", "units": units}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lessons", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=5)
+    parser.add_argument("--url", help="database to run against instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="quillio-materialize-"))
+    os.environ["DATABASE_URL"] = args.url or f"sqlite:///{workdir / 'materialize.db'}"
+    os.chdir(workdir)
+
+    from sqlalchemy import event
+    from app.configuration import app, db
+    from app.models import User, Course, Lesson, Unit
+    from app.services.outline_services import materialize_course, sync_course_outline
+
+    def legacy(user_id, title, course_data):
+        course = Course(user_id=user_id, course_title=title, course_data=course_data)
+        db.session.add(course)
+        db.session.commit()
+        for unit in course_data["units"]:
+            for lesson_data in unit["lessons"]:
+                db.session.add(Lesson(course_id=course.id, unit_title=unit["unit_title"],
+                                      lesson_title=lesson_data["lesson_title"]))
+                course.total_lessons += 1
+        sync_course_outline(course)
+        db.session.commit()
+        return course
+
+    def bulk(user_id, title, course_data):
+        course = materialize_course(user_id, title, course_data)
+        db.session.commit()
+        return course
+
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"materialize-{os.getpid()}@example.com", full_name="Benchmark", is_verified=True)
+        user.set_password("materialize")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        print(f"{db.engine.dialect.name}: {args.courses} courses x {args.lessons} lessons")
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            results = {}
+            for label, create in (("legacy", legacy), ("materialize", bulk)):
+                statements.clear()
+                started = time.perf_counter()
+                for i in range(args.courses):
+                    course = create(user_id, f"{label} {i}", _outline(args.lessons))
+                    assert Lesson.query.filter_by(course_id=course.id).count() == args.lessons
+                    db.session.expire_all()
+                elapsed = time.perf_counter() - started
+                # Each course is verified with one COUNT query; leave it out of the per-course figure
+                per_course = len(statements) / args.courses - 1
+                results[label] = elapsed
+                print(f"{label:12s} {args.courses / elapsed:8.2f} courses/s  {elapsed / args.courses * 1000:8.1f} ms/course"
+                      f"  {per_course:7.1f} statements/course")
+            print(f"speedup: {results['legacy'] / results['materialize']:.1f}x")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+            db.session.rollback()
+            if args.url:
+                courses = db.session.query(Course.id).filter(Course.user_id == user_id)
+                Lesson.query.filter(Lesson.course_id.in_(courses)).delete(synchronize_session=False)
+                Unit.query.filter(Unit.course_id.in_(courses)).delete(synchronize_session=False)
+                Course.query.filter(Course.user_id == user_id).delete(synchronize_session=False)
+                User.query.filter_by(id=user_id).delete(synchronize_session=False)
+                db.session.commit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
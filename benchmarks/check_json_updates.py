@@ -0,0 +1,70 @@
+"""
+Encoding check for update_json_key().
+
+Compiles the targeted JSON update for PostgreSQL and checks that the value reaches the
+driver as JSON text encoded once: a JSONB-typed parameter would be encoded a second time
+and store a JSON string like "\"hello\"" instead of "hello". On SQLite, where a database
+is at hand, the update is also run and read back.
+
+Usage: python benchmarks/check_json_updates.py
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, select, update  # noqa: E402
+from sqlalchemy.dialects import postgresql, sqlite  # noqa: E402
+from app.db_utils import _json_key_expression, get_json_type  # noqa: E402
+
+VALUES = ["hello", 'say "hi"\n', 42, None, ["a", 1], {"nested": "Ünïcode"}]
+
+table = Table("courses", MetaData(), Column("id", Integer, primary_key=True),
+              Column("course_data", get_json_type(), nullable=False))
+
+
+def _bound_values(statement, dialect):
+    """The parameters of statement as the driver receives them, after the types' bind processors."""
+    compiled = statement.compile(dialect=dialect)
+    params = compiled.construct_params()
+    values = []
+    for bind, name in compiled.bind_names.items():
+        processor = bind.type._cached_bind_processor(dialect)
+        values.append(processor(params[name]) if processor else params[name])
+    return values
+
+
+def main():
+    from app.db_utils import dumps_json
+
+    failures = []
+    dialect = postgresql.psycopg2.dialect()
+    for value in VALUES:
+        statement = update(table).values(course_data=_json_key_expression(table.c.course_data, "key", value,
+                                                                          "postgresql"))
+        bound = _bound_values(statement, dialect)
+        if dumps_json(value) not in bound:
+            failures.append(f"postgresql: {value!r} bound as {bound!r}")
+
+    engine = create_engine("sqlite://")
+    table.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(table.insert().values(id=1, course_data={"units": []}))
+        for value in VALUES:
+            conn.execute(update(table).values(course_data=_json_key_expression(table.c.course_data, "key", value,
+                                                                                sqlite.dialect.name)))
+            stored = conn.execute(select(table.c.course_data)).scalar()
+            if stored.get("key", "missing") != value or stored.get("units") != []:
+                failures.append(f"sqlite: {value!r} stored as {stored!r}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        return 1
+    print("OK: JSON key updates encode their value once")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Query-count regression check for the hot routes.
+
+Seeds the same throwaway database as check_query_plans.py, requests each hot route
+through the test client under assert_query_budget(), and fails if a route runs more
+statements than its budget or repeats one statement more than MAX_REPEATS times
+(an N+1 walk over a relationship). Raise a budget deliberately, in the same change
+that needs the extra query.
+
+Usage: python benchmarks/check_query_budgets.py [--verbose]
+"""
+import argparse
+import sys
+
+from check_query_plans import EMAIL, PASSWORD, _hot_paths, _seed, app
+
+from app.query_stats import assert_query_budget  # noqa: E402
+
+# Statements per route, including the server-side session's read and write (2 statements)
+BUDGETS = {
+    "course_dashboard": 4,
+    "show_course": 6,
+    # First visit: marks the lesson completed, commits, and reloads what the prefetch scheduling reads
+    "loading_lesson": 13,
+    # Includes the one query for the stored tutor chat
+    "show_lesson": 7,
+    "share_course": 5,
+    "public_course": 7,
+    "next_up_link": 4,
+    "reset_token_lookup": 1,
+}
+# loading_lesson reloads the user, lesson and course after its commit
+MAX_REPEATS = 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="print every statement of every route")
+    args = parser.parse_args()
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        course_id, lesson_id = _seed()
+
+    client = app.test_client()
+    client.post("/login", data={"email": EMAIL, "password": PASSWORD})
+
+    failures = 0
+    for name, request in _hot_paths(course_id, lesson_id):
+        budget = BUDGETS[name]
+        try:
+            with assert_query_budget(budget, max_repeats=MAX_REPEATS) as stats:
+                request(client)
+        except AssertionError as e:
+            print(f"[{name}] {e}")
+            failures += 1
+            continue
+        print(f"{name}: {stats.count}/{budget} queries, {stats.duration * 1000:.1f} ms")
+        if args.verbose:
+            for statement, times in stats.statements.most_common():
+                print(f"    {times}x {' '.join(statement.split())[:160]}")
+
+    if failures:
+        print(f"FAIL: {failures} route(s) over their query budget")
+        return 1
+    print("OK: every hot route is within its query budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
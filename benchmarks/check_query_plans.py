@@ -0,0 +1,148 @@
+"""
+Query-plan regression check for the hot routes.
+
+Builds a throwaway SQLite database from the models, requests each hot route through
+the test client while recording every statement it runs, and asks SQLite for the
+EXPLAIN QUERY PLAN of each one. Any statement that scans a whole table instead of
+searching an index is reported, and the script exits non-zero.
+
+Usage: python benchmarks/check_query_plans.py [--verbose]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKDIR = Path(tempfile.mkdtemp(prefix="quillio-plans-"))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR / 'plans.db'}"
+sys.path.insert(0, str(ROOT))
+os.chdir(WORKDIR)
+
+from sqlalchemy import event, text  # noqa: E402
+from app.configuration import app, db  # noqa: E402
+from app.models import User, Course, Lesson, CourseShare  # noqa: E402
+
+EMAIL = "plans@example.com"
+PASSWORD = "plans"
+
+
+def _seed():
+    """A few users with a few courses each, so the planner has real choices to make."""
+    from app.services import sync_course_outline
+    db.create_all()
+    owner = None
+    for u in range(5):
+        user = User(email=EMAIL if u == 0 else f"user{u}@example.com", full_name=f"User {u}", is_verified=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.flush()
+        owner = owner or user
+        for c in range(3):
+            units = [{"unit_title": f"Unit {n}", "test": {"test_title": f"Test {n}"},
+                      "lessons": [{"lesson_title": f"Lesson {n}.{i}"} for i in range(4)]} for n in range(3)]
+            course = Course(user_id=user.id, course_title=f"Course {u}.{c}", status="active",
+                            course_data={"units": units, "description": "Seeded."})
+            db.session.add(course)
+            db.session.flush()
+            for unit in units:
+                for lesson in unit["lessons"]:
+                    db.session.add(Lesson(course_id=course.id, unit_title=unit["unit_title"],
+                                          lesson_title=lesson["lesson_title"], html_content="<p>Seeded</p>"))
+            sync_course_outline(course)
+    db.session.commit()
+    course = Course.query.filter_by(user_id=owner.id).first()
+    share = CourseShare(course_id=course.id, token="plans-token", created_by=owner.id,
+                        expires_at=datetime.utcnow() + timedelta(days=1))
+    db.session.add(share)
+    db.session.commit()
+    lesson = Lesson.query.filter_by(course_id=course.id).first()
+    return course.id, lesson.id
+
+
+def _hot_paths(course_id, lesson_id):
+    from app.services.lesson_services import _generate_next_up_link
+
+    def next_up_link(client):
+        with app.test_request_context():
+            lesson = db.session.get(Lesson, lesson_id)
+            _generate_next_up_link(lesson, lesson.course.user)
+
+    def reset_token_lookup(client):
+        with app.app_context():
+            User.query.filter_by(reset_token="123456").first()
+
+    return [
+        ("course_dashboard", lambda c: c.get("/course_dashboard")),
+        ("show_course", lambda c: c.get(f"/course/{course_id}")),
+        ("loading_lesson", lambda c: c.get(f"/loading/lesson/{lesson_id}")),
+        ("show_lesson", lambda c: c.get(f"/lesson/{lesson_id}")),
+        ("share_course", lambda c: c.post("/share-course", json={"course_id": str(course_id)})),
+        ("public_course", lambda c: c.get(f"/course/public/{course_id}?token=plans-token")),
+        ("next_up_link", next_up_link),
+        ("reset_token_lookup", reset_token_lookup),
+    ]
+
+
+def _full_scans(connection, statement, parameters):
+    """Return the plan lines of a statement that scan an entire table."""
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        # "SCAN <table>" walks every row (or every index entry); "SEARCH" uses an index lookup
+        if detail.startswith("SCAN ") and not detail.startswith(("SCAN CONSTANT ROW", "SCAN SUBQUERY")):
+            scans.append(detail)
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="print every statement and its plan")
+    args = parser.parse_args()
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        course_id, lesson_id = _seed()
+        engine = db.engine
+
+    client = app.test_client()
+    client.post("/login", data={"email": EMAIL, "password": PASSWORD})
+
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")) and not executemany:
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    failures = 0
+    try:
+        for name, request in _hot_paths(course_id, lesson_id):
+            captured.clear()
+            request(client)
+            statements = list(captured)
+            with engine.connect() as connection:
+                for statement, parameters in statements:
+                    scans = _full_scans(connection, statement, parameters)
+                    if scans or args.verbose:
+                        print(f"[{name}] {' '.join(statement.split())[:160]}")
+                        for line in scans:
+                            print(f"    FULL SCAN: {line}")
+                    failures += bool(scans)
+            print(f"{name}: {len(statements)} statements checked")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    if failures:
+        print(f"FAIL: {failures} statement(s) scan a whole table")
+        return 1
+    print("OK: every hot-path statement uses an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+Load test for streaming endpoints: how many concurrent streams one server sustains.
+
+By default it starts gunicorn on a throwaway SQLite database with the model replaced
+by a fake that streams --chunks chunks, --chunk-delay seconds apart, then opens
+increasing numbers of concurrent /chat_with_tutor streams. A level is sustained when
+every stream completes and the slowest takes less than --slack times an unloaded stream.
+
+    python benchmarks/load_test_streams.py --worker-class sync
+    python benchmarks/load_test_streams.py --worker-class gevent --levels 50,100,200,400
+
+Against a running server, pass --url with a logged-in session cookie, a lesson id and
+the page's CSRF token:
+
+    python benchmarks/load_test_streams.py --url https://... --cookie session=... \\
+        --lesson-id ... --csrf-token ...
+"""
+import argparse
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+
+EMAIL = "loadtest@example.com"
+PASSWORD = "loadtest"
+
+
+def fake_model_app():
+    """Gunicorn app factory: the real app with the model replaced by a fixed-latency fake stream."""
+    from app.configuration import app
+    import app.ai_clients as ai_clients
+
+    chunks = int(os.getenv("LOADTEST_CHUNKS", 20))
+    delay = float(os.getenv("LOADTEST_CHUNK_DELAY", 0.25))
+
+    def fake_stream(prompt, model_name=None):
+        for i in range(chunks):
+            time.sleep(delay)
+            yield f"chunk {i} ", None
+
+    ai_clients._stream_gemini = fake_stream
+    app.config["WTF_CSRF_ENABLED"] = False
+    return app
+
+
+def _seed(db_url):
+    """Create the schema, a verified user and one lesson; returns the lesson id."""
+    os.environ["DATABASE_URL"] = db_url
+    sys.path.insert(0, str(ROOT))
+    from app.configuration import app, db
+    from app.models import User, Course, Lesson
+
+    with app.app_context():
+        db.create_all()
+        user = User(email=EMAIL, full_name="Load Test", is_verified=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.flush()
+        course = Course(user_id=user.id, course_title="Load test", status="active",
+                        course_data={"units": [{"unit_title": "U", "lessons": [{"lesson_title": "L"}]}]})
+        db.session.add(course)
+        db.session.flush()
+        lesson = Lesson(course_id=course.id, unit_title="U", lesson_title="L", html_content="<p>Lesson</p>")
+        db.session.add(lesson)
+        db.session.commit()
+        return str(lesson.id)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(args, db_url, workdir):
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=db_url, GUNICORN_BIND=f"127.0.0.1:{port}",
+               GUNICORN_WORKERS=str(args.workers), GUNICORN_WORKER_CLASS=args.worker_class,
+               GUNICORN_TIMEOUT="120", LOADTEST_CHUNKS=str(args.chunks),
+               LOADTEST_CHUNK_DELAY=str(args.chunk_delay), PYTHONPATH=str(ROOT))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "benchmarks.load_test_streams:fake_model_app()",
+         "--config", str(ROOT / "gunicorn.conf.py"), "--chdir", str(workdir)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{url}/health", timeout=5)
+            return server, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+
+def _login(url):
+    session = requests.Session()
+    response = session.post(f"{url}/login", data={"email": EMAIL, "password": PASSWORD}, allow_redirects=False)
+    if response.status_code != 302:
+        raise RuntimeError(f"login failed with status {response.status_code}")
+    return session.cookies.get_dict()
+
+
+def _stream_once(url, cookies, headers, lesson_id, timeout):
+    """Open one tutor stream and read it to the end; returns (time to first byte, total time)."""
+    started = time.perf_counter()
+    with requests.post(f"{url}/chat_with_tutor", cookies=cookies, headers=headers, stream=True, timeout=timeout,
+                       json={"lesson_id": lesson_id, "message": "Explain this lesson", "history": []}) as response:
+        response.raise_for_status()
+        first_byte = None
+        for _ in response.iter_content(chunk_size=None):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+    return first_byte or 0.0, time.perf_counter() - started
+
+
+def run_level(url, cookies, headers, lesson_id, concurrency, timeout):
+    results, errors = [], []
+    barrier = threading.Barrier(concurrency)
+
+    def client():
+        barrier.wait()
+        try:
+            results.append(_stream_once(url, cookies, headers, lesson_id, timeout))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker-class", default="gevent", choices=["sync", "gevent"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--levels", default="1,10,25,50,100,200")
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.25)
+    parser.add_argument("--slack", type=float, default=1.5,
+                        help="a level fails if the slowest stream takes longer than this multiple of an unloaded one")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument("--cookie", help="Cookie header of a logged-in session (with --url)")
+    parser.add_argument("--lesson-id", help="lesson to ask the tutor about (with --url)")
+    parser.add_argument("--csrf-token", help="CSRF token for the session (with --url)")
+    args = parser.parse_args()
+
+    server = None
+    headers = {}
+    if args.url:
+        if not (args.cookie and args.lesson_id):
+            parser.error("--url needs --cookie and --lesson-id")
+        url, lesson_id = args.url.rstrip("/"), args.lesson_id
+        cookies = dict(part.strip().split("=", 1) for part in args.cookie.split(";"))
+        if args.csrf_token:
+            headers["X-CSRFToken"] = args.csrf_token
+    else:
+        workdir = Path(tempfile.mkdtemp(prefix="quillio-loadtest-"))
+        db_url = f"sqlite:///{workdir / 'loadtest.db'}"
+        lesson_id = _seed(db_url)
+        server, url = _start_server(args, db_url, workdir)
+        cookies = _login(url)
+        print(f"gunicorn: {args.workers} x {args.worker_class} worker(s); "
+              f"fake stream: {args.chunks} chunks, {args.chunk_delay}s apart")
+
+    try:
+        _, baseline = _stream_once(url, cookies, headers, lesson_id, args.timeout)
+        print(f"unloaded stream: {baseline:.2f}s")
+        sustained = 0
+        for concurrency in [int(level) for level in args.levels.split(",")]:
+            results, errors, wall = run_level(url, cookies, headers, lesson_id, concurrency, args.timeout)
+            durations = sorted(total for _, total in results)
+            first_bytes = sorted(ttfb for ttfb, _ in results)
+            slowest = durations[-1] if durations else float("inf")
+            ok = not errors and slowest <= baseline * args.slack
+            print(f"{concurrency:5d} streams: ok={len(results):5d} errors={len(errors):4d} "
+                  f"ttfb p50={statistics.median(first_bytes) if first_bytes else 0:.2f}s "
+                  f"p95={first_bytes[math.ceil(len(first_bytes) * 0.95) - 1] if first_bytes else 0:.2f}s "
+                  f"slowest={slowest:.2f}s wall={wall:.2f}s {'OK' if ok else 'FAIL'}")
+            if not ok:
+                break
+            sustained = concurrency
+        print(f"sustained concurrent streams: {sustained}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
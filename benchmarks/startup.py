@@ -0,0 +1,72 @@
+"""
+Cold-import benchmark for the web app.
+
+Imports run.py in fresh interpreters with outbound network pointed at an
+unroutable proxy, so any network call made at import time shows up as a hang
+instead of a fast round trip.
+
+Usage: python benchmarks/startup.py [--runs 5] [--target 5.0]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Unroutable address: connections hang until the client times out
+BLACKHOLE_PROXY = "http://10.255.255.1:9"
+
+
+def _offline_env():
+    env = dict(os.environ)
+    env.update({
+        "HTTP_PROXY": BLACKHOLE_PROXY,
+        "HTTPS_PROXY": BLACKHOLE_PROXY,
+        "http_proxy": BLACKHOLE_PROXY,
+        "https_proxy": BLACKHOLE_PROXY,
+        "grpc_proxy": BLACKHOLE_PROXY,
+        "NO_PROXY": "",
+        "no_proxy": "",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def time_import(timeout):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import run"], cwd=ROOT, env=_offline_env(),
+                   check=True, timeout=timeout, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=float, default=5.0, help="maximum acceptable median import time in seconds")
+    args = parser.parse_args()
+
+    timings = []
+    for i in range(args.runs):
+        try:
+            elapsed = time_import(timeout=args.target * 10)
+        except subprocess.TimeoutExpired:
+            print(f"run {i + 1}: import did not finish within {args.target * 10:.0f}s (network call at import time?)")
+            return 1
+        timings.append(elapsed)
+        print(f"run {i + 1}: {elapsed:.3f}s")
+
+    median = statistics.median(timings)
+    print(f"median: {median:.3f}s  min: {min(timings):.3f}s  max: {max(timings):.3f}s  target: {args.target:.3f}s")
+    if median > args.target:
+        print("FAIL: cold import is slower than the target")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
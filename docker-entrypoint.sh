@@ -4,8 +4,27 @@ set -e
 # Ensure Flask knows where the app is
 export FLASK_APP=${FLASK_APP:-run.py}
 
+# `docker run <image> worker` runs only the background job worker, as its own service
+if [ "$1" = "worker" ]; then
+    echo "Starting background job worker..."
+    exec poetry run python worker.py
+fi
+
 echo "Running database migrations..."
 poetry run flask db upgrade
 
+# Unless the worker runs as a separate service (RUN_WORKER=false), keep one alongside
+# Gunicorn and restart it if it exits, so queued jobs don't silently stall
+if [ "${RUN_WORKER:-true}" = "true" ]; then
+    echo "Starting background job worker..."
+    (
+        while true; do
+            poetry run python worker.py || true
+            echo "Background job worker exited; restarting in 5 seconds..."
+            sleep 5
+        done
+    ) &
+fi
+
 echo "Starting Gunicorn..."
-exec poetry run gunicorn run:app --workers ${GUNICORN_WORKERS:-3} --bind 0.0.0.0:8000
+exec poetry run gunicorn run:app --config gunicorn.conf.py
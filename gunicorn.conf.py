@@ -0,0 +1,29 @@
+"""
+Gunicorn settings, configured through environment variables.
+
+GUNICORN_WORKER_CLASS=gevent serves every request in a greenlet instead of a whole
+process, so long-lived lesson and tutor streams no longer pin a worker each. In that
+mode gunicorn monkey-patches the standard library before loading the app; the AI client
+switches to synchronous REST calls and psycopg2 is made cooperative with psycogreen.
+Both come with the `gevent` extra: `poetry install --extras gevent`.
+"""
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+# Concurrent connections per worker for the gevent worker class
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+
+def post_fork(server, worker):
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning("psycogreen is not installed; PostgreSQL queries will block the gevent hub")
+        return
+    patch_psycopg()
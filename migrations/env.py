@@ -94,8 +94,11 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
-        # Disable FK constraints temporarily
-        connection.execute(text("PRAGMA foreign_keys=OFF"))
+        # Disable FK constraints temporarily (SQLite only). Commit so the PRAGMA does not
+        # leave an open transaction that would swallow the migration's own transaction.
+        if connection.dialect.name == 'sqlite':
+            connection.execute(text("PRAGMA foreign_keys=OFF"))
+            connection.commit()
 
         context.configure(
             connection=connection,
@@ -0,0 +1,52 @@
+"""Add jobs table for the background job queue
+
+Revision ID: 3c1f0a9d2b7e
+Revises: f2bf974c4bb0
+Create Date: 2026-10-17 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0a9d2b7e'
+down_revision = 'f2bf974c4bb0'
+branch_labels = None
+depends_on = None
+
+
+def _json_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.JSONB()
+    return sa.Text()
+
+
+def _guid_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.UUID()
+    return sa.CHAR(length=32)
+
+
+def upgrade():
+    op.create_table('jobs',
+    sa.Column('id', _guid_type(), nullable=False),
+    sa.Column('user_id', _guid_type(), nullable=True),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('payload', _json_type(), nullable=False),
+    sa.Column('result', _json_type(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_status_created_at', 'jobs', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_jobs_status_created_at', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,47 @@
+"""Add lesson generation and chunk tables for resumable lesson streams
+
+Revision ID: 7a4d2e9c5b18
+Revises: 3c1f0a9d2b7e
+Create Date: 2026-10-17 14:03:27.502119
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '7a4d2e9c5b18'
+down_revision = '3c1f0a9d2b7e'
+branch_labels = None
+depends_on = None
+
+
+def _guid_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.UUID()
+    return sa.CHAR(length=32)
+
+
+def upgrade():
+    op.create_table('lesson_generations',
+    sa.Column('lesson_id', _guid_type(), nullable=False),
+    sa.Column('attempt', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('chunk_count', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['lesson_id'], ['lessons.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('lesson_id')
+    )
+    op.create_table('lesson_chunks',
+    sa.Column('lesson_id', _guid_type(), nullable=False),
+    sa.Column('seq', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['lesson_id'], ['lessons.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('lesson_id', 'seq')
+    )
+
+
+def downgrade():
+    op.drop_table('lesson_chunks')
+    op.drop_table('lesson_generations')
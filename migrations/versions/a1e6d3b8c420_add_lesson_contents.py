@@ -0,0 +1,65 @@
+"""Move lesson HTML into content-addressed lesson_contents
+
+Revision ID: a1e6d3b8c420
+Revises: f7c3a8e2d614
+Create Date: 2026-10-17 21:17:36.004712
+
+"""
+import hashlib
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a1e6d3b8c420'
+down_revision = 'f7c3a8e2d614'
+branch_labels = None
+depends_on = None
+
+lesson_contents = sa.table('lesson_contents', sa.column('hash'), sa.column('html'), sa.column('created_at'))
+lessons = sa.table('lessons', sa.column('id'), sa.column('html_content'), sa.column('content_hash'))
+
+
+def upgrade():
+    op.create_table('lesson_contents',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('html', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    with op.batch_alter_table('lessons', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    bind = op.get_bind()
+    stored = set()
+    now = datetime.utcnow()
+    for lesson_id, html in bind.execute(sa.select(lessons.c.id, lessons.c.html_content)
+                                        .where(lessons.c.html_content.isnot(None))).fetchall():
+        digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        if digest not in stored:
+            bind.execute(lesson_contents.insert().values(hash=digest, html=html, created_at=now))
+            stored.add(digest)
+        bind.execute(lessons.update().where(lessons.c.id == lesson_id).values(content_hash=digest))
+
+    with op.batch_alter_table('lessons', schema=None) as batch_op:
+        batch_op.create_foreign_key('fk_lessons_content_hash_lesson_contents', 'lesson_contents',
+                                    ['content_hash'], ['hash'])
+        batch_op.create_index('ix_lessons_content_hash', ['content_hash'], unique=False)
+        batch_op.drop_column('html_content')
+
+
+def downgrade():
+    with op.batch_alter_table('lessons', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('html_content', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    bind.execute(lessons.update().values(
+        html_content=sa.select(lesson_contents.c.html)
+        .where(lesson_contents.c.hash == lessons.c.content_hash).scalar_subquery()))
+
+    with op.batch_alter_table('lessons', schema=None) as batch_op:
+        batch_op.drop_index('ix_lessons_content_hash')
+        batch_op.drop_constraint('fk_lessons_content_hash_lesson_contents', type_='foreignkey')
+        batch_op.drop_column('content_hash')
+
+    op.drop_table('lesson_contents')
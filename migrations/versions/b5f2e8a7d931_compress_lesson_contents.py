@@ -0,0 +1,53 @@
+"""Store lesson_contents.html compressed
+
+Revision ID: b5f2e8a7d931
+Revises: a1e6d3b8c420
+Create Date: 2026-10-17 21:52:20.383157
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.db_utils import compress_text, decompress_text
+
+# revision identifiers, used by Alembic.
+revision = 'b5f2e8a7d931'
+down_revision = 'a1e6d3b8c420'
+branch_labels = None
+depends_on = None
+
+lesson_contents = sa.table('lesson_contents', sa.column('hash'), sa.column('html'), sa.column('html_compressed'),
+                           sa.column('size'))
+
+
+def upgrade():
+    with op.batch_alter_table('lesson_contents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('html_compressed', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('size', sa.Integer(), server_default='0', nullable=False))
+
+    bind = op.get_bind()
+    for digest, html in bind.execute(sa.select(lesson_contents.c.hash, lesson_contents.c.html)).fetchall():
+        bind.execute(lesson_contents.update().where(lesson_contents.c.hash == digest)
+                     .values(html_compressed=compress_text(html), size=len(html)))
+
+    with op.batch_alter_table('lesson_contents', schema=None) as batch_op:
+        batch_op.drop_column('html')
+        batch_op.alter_column('html_compressed', new_column_name='html', existing_type=sa.LargeBinary(),
+                              nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('lesson_contents', schema=None) as batch_op:
+        batch_op.alter_column('html', new_column_name='html_compressed', existing_type=sa.LargeBinary(),
+                              nullable=True)
+    with op.batch_alter_table('lesson_contents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('html', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    for digest, data in bind.execute(sa.select(lesson_contents.c.hash, lesson_contents.c.html_compressed)).fetchall():
+        bind.execute(lesson_contents.update().where(lesson_contents.c.hash == digest)
+                     .values(html=decompress_text(data)))
+
+    with op.batch_alter_table('lesson_contents', schema=None) as batch_op:
+        batch_op.drop_column('html_compressed')
+        batch_op.drop_column('size')
+        batch_op.alter_column('html', existing_type=sa.Text(), nullable=False)
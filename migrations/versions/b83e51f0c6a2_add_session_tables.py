@@ -0,0 +1,57 @@
+"""Add server-side session and session payload tables
+
+Revision ID: b83e51f0c6a2
+Revises: 7a4d2e9c5b18
+Create Date: 2026-10-17 16:41:09.227310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b83e51f0c6a2'
+down_revision = '7a4d2e9c5b18'
+branch_labels = None
+depends_on = None
+
+
+def _json_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.JSONB()
+    return sa.Text()
+
+
+def _guid_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.UUID()
+    return sa.CHAR(length=32)
+
+
+def upgrade():
+    # Earlier versions of the app let Flask-Session create this table on startup, so it may already exist
+    if not sa.inspect(op.get_bind()).has_table('sessions'):
+        op.create_table('sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.String(length=255), nullable=True),
+        sa.Column('data', sa.LargeBinary(), nullable=True),
+        sa.Column('expiry', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('session_id')
+        )
+    op.create_table('session_payloads',
+    sa.Column('id', _guid_type(), nullable=False),
+    sa.Column('user_id', _guid_type(), nullable=True),
+    sa.Column('data', _json_type(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_session_payloads_expires_at', 'session_payloads', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_session_payloads_expires_at', table_name='session_payloads')
+    op.drop_table('session_payloads')
+    op.drop_table('sessions')
@@ -0,0 +1,64 @@
+"""Add test attempt and answer tables
+
+Revision ID: c5d0e7a31f94
+Revises: b83e51f0c6a2
+Create Date: 2026-10-17 18:05:52.640118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c5d0e7a31f94'
+down_revision = 'b83e51f0c6a2'
+branch_labels = None
+depends_on = None
+
+
+def _json_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.JSONB()
+    return sa.Text()
+
+
+def _guid_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.UUID()
+    return sa.CHAR(length=32)
+
+
+def upgrade():
+    op.create_table('test_attempts',
+    sa.Column('id', _guid_type(), nullable=False),
+    sa.Column('user_id', _guid_type(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('course_id', _guid_type(), nullable=True),
+    sa.Column('unit_title', sa.String(length=200), nullable=True),
+    sa.Column('test_data', _json_type(), nullable=False),
+    sa.Column('question_count', sa.Integer(), nullable=False),
+    sa.Column('answer_count', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_test_attempts_user_id', 'test_attempts', ['user_id'], unique=False)
+    op.create_table('test_answers',
+    sa.Column('attempt_id', _guid_type(), nullable=False),
+    sa.Column('position', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('question', sa.Text(), nullable=False),
+    sa.Column('answer', sa.Text(), nullable=False),
+    sa.Column('answer_value', sa.Text(), nullable=False),
+    sa.Column('correct_answer', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['attempt_id'], ['test_attempts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('attempt_id', 'position')
+    )
+
+
+def downgrade():
+    op.drop_table('test_answers')
+    op.drop_index('ix_test_attempts_user_id', table_name='test_attempts')
+    op.drop_table('test_attempts')
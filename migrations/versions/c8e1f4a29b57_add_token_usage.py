@@ -0,0 +1,48 @@
+"""Add the token_usage ledger
+
+Revision ID: c8e1f4a29b57
+Revises: b5f2e8a7d931
+Create Date: 2026-10-17 22:31:08.517240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c8e1f4a29b57'
+down_revision = 'b5f2e8a7d931'
+branch_labels = None
+depends_on = None
+
+
+def _guid_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.UUID()
+    return sa.CHAR(length=32)
+
+
+def upgrade():
+    op.create_table('token_usage',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', _guid_type(), nullable=False),
+    sa.Column('feature', sa.String(length=50), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=True),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('output_tokens', sa.Integer(), nullable=False),
+    sa.Column('latency_ms', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('token_usage', schema=None) as batch_op:
+        batch_op.create_index('ix_token_usage_user_id_created_at', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_token_usage_created_at', ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('token_usage', schema=None) as batch_op:
+        batch_op.drop_index('ix_token_usage_created_at')
+        batch_op.drop_index('ix_token_usage_user_id_created_at')
+
+    op.drop_table('token_usage')
@@ -0,0 +1,31 @@
+"""Add token_usage.total_tokens and token_usage.estimated
+
+Revision ID: d6a9b3e1f258
+Revises: c8e1f4a29b57
+Create Date: 2026-10-17 22:58:44.106319
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd6a9b3e1f258'
+down_revision = 'c8e1f4a29b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('token_usage', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_tokens', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('estimated', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    # Earlier rows were charged their estimated output tokens only; keep the ledger summing to users.tokens_used
+    op.execute(sa.text("UPDATE token_usage SET total_tokens = output_tokens, estimated = :estimated")
+               .bindparams(estimated=True))
+
+
+def downgrade():
+    with op.batch_alter_table('token_usage', schema=None) as batch_op:
+        batch_op.drop_column('estimated')
+        batch_op.drop_column('total_tokens')
@@ -0,0 +1,34 @@
+"""Add indexes for the hot lookup paths
+
+Revision ID: d9a2c4f86e13
+Revises: c5d0e7a31f94
+Create Date: 2026-10-17 19:22:14.908453
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'd9a2c4f86e13'
+down_revision = 'c5d0e7a31f94'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_courses_user_id_status', 'courses', ['user_id', 'status']),
+    ('ix_lessons_course_id_lesson_title', 'lessons', ['course_id', 'lesson_title']),
+    ('ix_lessons_course_id_unit_title', 'lessons', ['course_id', 'unit_title']),
+    ('ix_lessons_course_id_is_completed', 'lessons', ['course_id', 'is_completed']),
+    ('ix_course_shares_course_id_token', 'course_shares', ['course_id', 'token']),
+    ('ix_course_shares_course_id_created_by', 'course_shares', ['course_id', 'created_by']),
+    ('ix_jobs_user_id_kind_status', 'jobs', ['user_id', 'kind', 'status']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,41 @@
+"""Add lesson_artifacts
+
+Revision ID: e2c5f9a7b314
+Revises: d6a9b3e1f258
+Create Date: 2026-10-17 23:37:12.804951
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'e2c5f9a7b314'
+down_revision = 'd6a9b3e1f258'
+branch_labels = None
+depends_on = None
+
+
+def _json_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.JSONB()
+    return sa.Text()
+
+
+def upgrade():
+    op.create_table('lesson_artifacts',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('plain_text', sa.LargeBinary(), nullable=False),
+    sa.Column('summary', sa.Text(), nullable=True),
+    sa.Column('key_concepts', _json_type(), nullable=False),
+    sa.Column('html_tokens', sa.Integer(), nullable=False),
+    sa.Column('text_tokens', sa.Integer(), nullable=False),
+    sa.Column('summary_tokens', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['content_hash'], ['lesson_contents.hash'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+
+
+def downgrade():
+    op.drop_table('lesson_artifacts')
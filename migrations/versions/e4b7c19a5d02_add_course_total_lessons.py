@@ -0,0 +1,31 @@
+"""Add courses.total_lessons and backfill the progress counters
+
+Revision ID: e4b7c19a5d02
+Revises: d9a2c4f86e13
+Create Date: 2026-10-17 20:03:41.271590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c19a5d02'
+down_revision = 'd9a2c4f86e13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_lessons', sa.Integer(), server_default='0', nullable=False))
+
+    # From here on the counters are maintained incrementally, so start them from the true counts
+    op.execute("UPDATE courses SET "
+               "total_lessons = (SELECT COUNT(*) FROM lessons WHERE lessons.course_id = courses.id), "
+               "completed_lessons = (SELECT COUNT(*) FROM lessons "
+               "WHERE lessons.course_id = courses.id AND lessons.is_completed)")
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('total_lessons')
@@ -0,0 +1,56 @@
+"""Add chat_conversations and chat_messages
+
+Revision ID: f4b8d2c6e913
+Revises: e2c5f9a7b314
+Create Date: 2026-10-17 23:58:41.236074
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'f4b8d2c6e913'
+down_revision = 'e2c5f9a7b314'
+branch_labels = None
+depends_on = None
+
+
+def _guid_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.UUID()
+    return sa.CHAR(length=32)
+
+
+def upgrade():
+    op.create_table('chat_conversations',
+    sa.Column('id', _guid_type(), nullable=False),
+    sa.Column('user_id', _guid_type(), nullable=False),
+    sa.Column('lesson_id', _guid_type(), nullable=False),
+    sa.Column('summary', sa.Text(), nullable=True),
+    sa.Column('summarized_through', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['lesson_id'], ['lessons.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'lesson_id', name='uq_chat_conversations_user_id_lesson_id')
+    )
+    op.create_table('chat_messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', _guid_type(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(length=10), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('tokens', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['conversation_id'], ['chat_conversations.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('conversation_id', 'seq', name='uq_chat_messages_conversation_id_seq')
+    )
+
+
+def downgrade():
+    op.drop_table('chat_messages')
+    op.drop_table('chat_conversations')
@@ -0,0 +1,108 @@
+"""Add units table and lesson positions, derived from course_data
+
+Revision ID: f7c3a8e2d614
+Revises: e4b7c19a5d02
+Create Date: 2026-10-17 20:41:09.518334
+
+"""
+import json
+import uuid
+from collections import defaultdict
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'f7c3a8e2d614'
+down_revision = 'e4b7c19a5d02'
+branch_labels = None
+depends_on = None
+
+
+def _guid_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.UUID()
+    return sa.CHAR(length=32)
+
+
+def _new_id():
+    if op.get_bind().dialect.name == 'postgresql':
+        return str(uuid.uuid4())
+    return uuid.uuid4().hex
+
+
+def _backfill():
+    """Create units and lesson positions for existing courses, the same way sync_course_outline() does."""
+    bind = op.get_bind()
+    units = sa.table('units', sa.column('id'), sa.column('course_id'), sa.column('position'),
+                     sa.column('unit_title'), sa.column('test_title'))
+    lessons = sa.table('lessons', sa.column('id'), sa.column('course_id'), sa.column('unit_id'),
+                       sa.column('position'), sa.column('unit_title'), sa.column('lesson_title'))
+    lessons_by_course = defaultdict(list)
+    for lesson in bind.execute(sa.select(lessons.c.id, lessons.c.course_id, lessons.c.unit_title,
+                                         lessons.c.lesson_title)):
+        lessons_by_course[lesson.course_id].append(lesson)
+
+    for course_id, course_data in bind.execute(sa.text("SELECT id, course_data FROM courses")):
+        if isinstance(course_data, str):
+            course_data = json.loads(course_data)
+        by_key, by_title = defaultdict(list), defaultdict(list)
+        for lesson in lessons_by_course.get(course_id, []):
+            by_key[(lesson.unit_title, lesson.lesson_title)].append(lesson.id)
+            by_title[lesson.lesson_title].append(lesson.id)
+        placed = set()
+
+        def take(candidates):
+            for candidate in candidates:
+                if candidate not in placed:
+                    placed.add(candidate)
+                    return candidate
+            return None
+
+        position = 0
+        for index, unit in enumerate((course_data or {}).get('units', [])):
+            unit_id = _new_id()
+            bind.execute(units.insert().values(id=unit_id, course_id=course_id, position=index,
+                                               unit_title=unit.get('unit_title') or '',
+                                               test_title=(unit.get('test') or {}).get('test_title')))
+            for lesson in unit.get('lessons', []):
+                title = lesson.get('lesson_title')
+                # Lessons saved before unit titles were recorded have an empty unit_title
+                lesson_id = take(by_key.get((unit.get('unit_title'), title), ())) or take(by_title.get(title, ()))
+                if lesson_id is None:
+                    continue
+                bind.execute(lessons.update().where(lessons.c.id == lesson_id)
+                             .values(unit_id=unit_id, position=position, unit_title=unit.get('unit_title') or ''))
+                position += 1
+
+
+def upgrade():
+    op.create_table('units',
+    sa.Column('id', _guid_type(), nullable=False),
+    sa.Column('course_id', _guid_type(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('unit_title', sa.String(), nullable=False),
+    sa.Column('test_title', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_units_course_id_position', 'units', ['course_id', 'position'], unique=False)
+
+    with op.batch_alter_table('lessons', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unit_id', _guid_type(), nullable=True))
+        batch_op.add_column(sa.Column('position', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_lessons_unit_id_units', 'units', ['unit_id'], ['id'], ondelete='SET NULL')
+        batch_op.create_index('ix_lessons_course_id_position', ['course_id', 'position'], unique=False)
+
+    _backfill()
+
+
+def downgrade():
+    with op.batch_alter_table('lessons', schema=None) as batch_op:
+        batch_op.drop_index('ix_lessons_course_id_position')
+        batch_op.drop_constraint('fk_lessons_unit_id_units', type_='foreignkey')
+        batch_op.drop_column('position')
+        batch_op.drop_column('unit_id')
+
+    op.drop_index('ix_units_course_id_position', table_name='units')
+    op.drop_table('units')
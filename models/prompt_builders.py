@@ -237,16 +237,20 @@ class CoursePromptBuilder:
             if profile_details:
                 user_context_string = f"- Personalize the course for the following user profile: {'; '.join(profile_details)}."
 
+        knowledge_assessment_string = ""
+        basis = "their performance"
+        if knowledge_assessment:
+            knowledge_assessment_string = f'Here is a qualitative assessment of their knowledge based on the test:\n            "{knowledge_assessment}"'
+            basis = "their performance and the overall assessment"
+
         return f"""
             A learner has completed a test on the topic: "{topic}".
-            Here is a qualitative assessment of their knowledge based on the test:
-            "{knowledge_assessment}"
-
+            {knowledge_assessment_string}
             Below is a detailed breakdown of their responses:
             {assessed_answers_string}
 
             Your task:
-            - Based on their performance and the overall assessment, design a personalized course outline to help them improve.
+            - Based on {basis}, design a personalized course outline to help them improve.
             {user_context_string}
             - The course should include units. Each unit should contain lessons (with estimated completion time in minutes) and a test.
             - Do NOT generate lesson or test content yet—only the structure.
@@ -281,9 +285,12 @@ class CoursePromptBuilder:
 class ChatPromptBuilder:
     @staticmethod
     def build_tutor_prompt(lesson_content, unit_title, chat_history, user_question, 
-                          language="english", course_structure=None, current_lesson_title=None):
+                          language="english", course_structure=None, current_lesson_title=None,
+                          conversation_summary=None):
         # Format the chat history for the prompt
         history_string = "\n".join([f"{msg['role']}: {msg['content']}" for msg in chat_history])
+        if conversation_summary:
+            history_string = f"Summary of the earlier conversation: {conversation_summary}\n\n{history_string}"
         
         course_context = ""
         if course_structure:
@@ -370,6 +377,20 @@ class ChatPromptBuilder:
         Now, provide a helpful response to the student's question.
         """.strip()
 
+    @staticmethod
+    def build_conversation_summary_prompt(previous_summary, messages, max_words=200):
+        history_string = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+        previous = f"Summary so far:\n{previous_summary}\n\n" if previous_summary else ""
+        return f"""
+        You are keeping notes on a conversation between a student and their tutor, "ai" in the transcript.
+        {previous}New messages:
+        {history_string}
+
+        Write an updated summary of the whole conversation in at most {max_words} words, in the language
+        of the conversation. Keep what the student asked, what they struggled with or got wrong, and what
+        the tutor explained. Return only the summary text.
+        """.strip()
+
 
 class CourseEditorPromptBuilder:
     @staticmethod
@@ -428,6 +449,20 @@ class CourseEditorPromptBuilder:
 
 
 class LessonPromptBuilder:
+    @staticmethod
+    def build_lesson_summary_prompt(lesson_title, lesson_text):
+        return f"""
+            Summarize the lesson "{lesson_title}" below for use as context by a tutor and a test writer.
+
+            --- LESSON START ---
+            {lesson_text}
+            --- LESSON END ---
+
+            Return a JSON object with exactly these keys:
+            - "summary": 3-5 sentences covering what the lesson teaches, in the language of the lesson.
+            - "key_concepts": a list of 3-8 short phrases naming the concepts, terms or skills it introduces.
+            """
+
     @staticmethod
     def build_lesson_content_prompt(lesson_title, unit_title, language="english", lesson_duration=15, user_profile=None,
                                     course_structure=None, current_lesson_index=None, total_lessons=None):
@@ -1,4 +1,11 @@
+import os
 from app.configuration import app
 
 if __name__ == '__main__':
-    app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
+    # Local development: process background jobs in-process instead of running worker.py.
+    # With the reloader, __main__ runs in both the watching parent and the serving child;
+    # only the child (which is restarted on code changes) runs the worker.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.jobs import start_worker_thread
+        start_worker_thread(app)
+    app.run(debug=True, host='127.0.0.1', port=5000)
@@ -0,0 +1,5 @@
+from app.configuration import app
+from app.jobs import run_worker
+
+if __name__ == '__main__':
+    run_worker(app)